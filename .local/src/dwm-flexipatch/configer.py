@@ -2,8 +2,13 @@
 import os
 import re
 import json
+import zlib
+import bisect
 import shutil
+import hashlib
+import tempfile
 import subprocess
+import signal
 import datetime
 import time
 import threading
@@ -20,6 +25,1328 @@ except ImportError:
     print("Fedora: sudo dnf install python3-gobject gtk3")
     sys.exit(1)
 
+# Read once while still single-threaded: os.umask() can only be queried by
+# setting it, which would race with threads creating files
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+# atomic_write, BackupStore, build_jobs, make_targets, compiler_version and
+# BuildFingerprint have twins in ../suckless_patcher.py. Both scripts stay
+# single-file so either runs on its own; a fix to one copy belongs in both.
+
+
+def atomic_write(path, data):
+    """Replace path with data (bytes) via a temp file in the same directory.
+
+    An existing file keeps its mode; a new one gets 0666 minus the umask.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            # mkstemp creates 0600; give new files what open() would
+            mode = 0o666 & ~UMASK
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class BackupStore:
+    """Content-addressed storage for backed up configuration files.
+
+    File contents are stored once as zlib-compressed blobs named by their
+    sha256 under <backup_dir>/objects, so a backup of unchanged files only
+    costs its metadata.json manifest. Manifests are also indexed in the
+    append-only <backup_dir>/catalog.jsonl so listing never has to open
+    every backup directory.
+    """
+    CATALOG = 'catalog.jsonl'
+
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.catalog_path = os.path.join(root, self.CATALOG)
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def put(self, data):
+        """Store data if it is not there yet and return its digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, zlib.compress(data))
+        return digest
+
+    def get(self, digest):
+        """Return the contents stored under digest"""
+        with open(self.object_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Corrupt backup object {digest}")
+        return data
+
+    def append_catalog(self, record):
+        """Add a backup entry, or a {'deleted': name} record, to the catalog"""
+        if not os.path.exists(self.catalog_path):
+            # The rebuild already sees the manifest just written or removed
+            self.rebuild_catalog()
+            return
+        with open(self.catalog_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def read_catalog(self):
+        """Return the live catalog entries sorted oldest first"""
+        entries = {}
+        deleted = 0
+        try:
+            f = open(self.catalog_path, 'r')
+        except FileNotFoundError:
+            return self.rebuild_catalog()
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn final line from an interrupted append
+                if 'deleted' in record:
+                    deleted += entries.pop(record['deleted'], None) is not None
+                else:
+                    entries[record['name']] = record
+        catalog = sorted(entries.values(), key=lambda e: e['created'])
+        if deleted > len(catalog):
+            self.write_catalog(catalog)
+        return catalog
+
+    def write_catalog(self, catalog):
+        os.makedirs(self.root, exist_ok=True)
+        atomic_write(self.catalog_path, ''.join(json.dumps(e) + '\n' for e in catalog).encode())
+
+    def rebuild_catalog(self):
+        """Recreate the catalog from the backup directories on disk"""
+        catalog = []
+        if not os.path.exists(self.root):
+            return catalog
+
+        for item in os.listdir(self.root):
+            metadata_path = os.path.join(self.root, item, 'metadata.json')
+            if not os.path.exists(metadata_path):
+                continue
+            try:
+                with open(metadata_path, 'r') as f:
+                    metadata = json.load(f)
+            except Exception:
+                # If metadata is invalid, still include the backup with minimal info
+                metadata = {}
+            catalog.append({
+                'name': item,
+                'created': metadata.get('created', item.replace('dwm_backup_', '')),
+                'dwm_path': metadata.get('dwm_path', 'Unknown'),
+                'files': metadata.get('files', []),
+                'objects': metadata.get('objects', {})
+            })
+
+        catalog.sort(key=lambda e: e['created'])
+        self.write_catalog(catalog)
+        return catalog
+
+    def query(self, since=None, until=None, offset=0, limit=None):
+        """Catalog entries created in [since, until], newest first and paged.
+
+        since/until take datetimes or "%Y%m%d_%H%M%S" strings.
+        """
+        catalog = self.read_catalog()
+        if isinstance(since, datetime.datetime):
+            since = since.strftime("%Y%m%d_%H%M%S")
+        if isinstance(until, datetime.datetime):
+            until = until.strftime("%Y%m%d_%H%M%S")
+        lo = bisect.bisect_left(catalog, since, key=lambda e: e['created']) if since else 0
+        hi = bisect.bisect_right(catalog, until, key=lambda e: e['created']) if until else len(catalog)
+        newest = hi - offset
+        oldest = max(lo, newest - limit) if limit is not None else lo
+        return catalog[oldest:max(newest, oldest)][::-1]
+
+    def gc(self):
+        """Delete blobs no manifest refers to; returns (blobs, bytes) freed"""
+        referenced = set()
+        for entry in self.read_catalog():
+            referenced.update(entry.get('objects', {}).values())
+        removed = freed = 0
+        if not os.path.isdir(self.objects_dir):
+            return removed, freed
+        for prefix in os.scandir(self.objects_dir):
+            if not prefix.is_dir():
+                continue
+            for blob in os.scandir(prefix.path):
+                if prefix.name + blob.name not in referenced:
+                    freed += blob.stat().st_size
+                    os.remove(blob.path)
+                    removed += 1
+            if not os.listdir(prefix.path):
+                os.rmdir(prefix.path)
+        return removed, freed
+
+
+def build_jobs():
+    """Number of CPUs this process is allowed to run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+MAKE_RULE_RE = re.compile(r'^([^\s:=#.$%][^\s:=#$%]*)[ \t]*:(?!=)[ \t]*([^;#\n]*)', re.M)
+MAKE_PREFIX_RE = re.compile(r'^PREFIX\s*[:?]?=\s*(\S+)', re.M)
+COMPILER_VERSIONS = {}
+
+
+def make_targets(makefile):
+    """Programs a Makefile builds by default.
+
+    The prerequisites of all:, or of install: when there is no all: (the
+    dwmblocks Makefile), else the first rule, which is make's default goal.
+    """
+    rules = {}
+    for target, prerequisites in MAKE_RULE_RE.findall(makefile):
+        rules.setdefault(target, []).extend(prerequisites.split())
+    if not rules:
+        return []
+    names = rules.get('all') or rules.get('install') or [next(iter(rules))]
+    targets = []
+    for name in names:
+        if name not in ('all', 'options') and name not in targets:
+            targets.append(name)
+    return targets
+
+
+def compiler_version(cc):
+    """First line of `cc --version`, remembered per compiler"""
+    if cc not in COMPILER_VERSIONS:
+        try:
+            result = subprocess.run([cc, '--version'], stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, universal_newlines=True)
+            COMPILER_VERSIONS[cc] = result.stdout.partition('\n')[0]
+        except OSError:
+            COMPILER_VERSIONS[cc] = ''
+    return COMPILER_VERSIONS[cc]
+
+
+class BuildFingerprint:
+    """Decides whether a project needs a full, incremental or no build.
+
+    The fingerprint hashes patches.h, config.h and config.mk, the compiler
+    version and the rest of the source tree; it is saved to
+    <project>/.build-fingerprint.json after a successful install together
+    with the stat of the installed binaries. All suckless Makefiles list the
+    config headers as object prerequisites, so when only those changed a
+    plain `make` is enough. Anything else changing (compiler, sources that
+    are #included without being prerequisites) gets `make clean` first.
+    """
+    FILE = '.build-fingerprint.json'
+    CONFIG_FILES = ('patches.h', 'config.h', 'config.mk')
+    SOURCE_SUFFIXES = ('.c', '.h', '.mk', 'Makefile')
+
+    def __init__(self, path):
+        self.path = path
+        self.record_path = os.path.join(path, self.FILE)
+
+    def read_text(self, name):
+        try:
+            with open(os.path.join(self.path, name), 'r', errors='replace') as f:
+                return f.read()
+        except OSError:
+            return ''
+
+    def file_hash(self, name):
+        try:
+            with open(os.path.join(self.path, name), 'rb') as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+
+    def tree_hash(self):
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(self.path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                rel = os.path.relpath(os.path.join(root, name), self.path)
+                if rel in self.CONFIG_FILES or not name.endswith(self.SOURCE_SUFFIXES):
+                    continue
+                digest.update(rel.encode() + b'\0' + (self.file_hash(rel) or '').encode())
+        return digest.hexdigest()
+
+    def compute(self):
+        makefiles = self.read_text('config.mk') + self.read_text('Makefile')
+        cc = re.search(r'^CC\s*[:?]?=\s*(\S+)', makefiles, re.M)
+        return {
+            'config': {name: self.file_hash(name) for name in self.CONFIG_FILES},
+            'compiler': compiler_version(cc.group(1) if cc else 'cc'),
+            'tree': self.tree_hash()
+        }
+
+    def targets(self):
+        """Programs built by a plain `make`"""
+        return make_targets(self.read_text('Makefile'))
+
+    def bindir(self):
+        prefix = MAKE_PREFIX_RE.search(self.read_text('config.mk') + self.read_text('Makefile'))
+        return os.path.join(prefix.group(1) if prefix else '/usr/local', 'bin')
+
+    def binaries(self):
+        """Paths `make install` puts the project's programs at"""
+        return [os.path.join(self.bindir(), t) for t in self.targets()]
+
+    def load(self):
+        try:
+            with open(self.record_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, fingerprint, installed=True):
+        """Record a successful build; installed=False after a compile only.
+
+        A compile-only record has no installed binaries, so plan() still
+        asks for an (incremental) build and install but not for make clean.
+        """
+        stats = {}
+        for binary in self.binaries() if installed else []:
+            if os.path.exists(binary):
+                st = os.stat(binary)
+                stats[binary] = [st.st_size, st.st_mtime_ns]
+        record = dict(fingerprint, installed=stats)
+        try:
+            atomic_write(self.record_path, json.dumps(record, indent=2).encode())
+        except OSError as e:
+            print(f"Could not save build fingerprint: {e}")
+
+    def plan(self):
+        """Return ('up to date'|'incremental'|'full', fingerprint)"""
+        fingerprint = self.compute()
+        previous = self.load()
+        if not previous or previous.get('compiler') != fingerprint['compiler'] \
+                or previous.get('tree') != fingerprint['tree']:
+            return 'full', fingerprint
+        if previous.get('config') != fingerprint['config']:
+            return 'incremental', fingerprint
+        installed = previous.get('installed') or {}
+        for binary, (size, mtime_ns) in installed.items():
+            try:
+                st = os.stat(binary)
+            except OSError:
+                return 'incremental', fingerprint
+            if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                return 'incremental', fingerprint
+        return ('up to date' if installed else 'incremental'), fingerprint
+
+
+class BuildRunner:
+    """Runs build steps one after another in a worker thread.
+
+    Each step is (name, argv) or (name, argv, stdin_text) and runs with
+    cwd= set, so nothing touches the process-wide working directory.
+    on_line(text) gets stdout and stderr line by line as they arrive and
+    on_done(success, phases) gets the (name, returncode, seconds) of every
+    step that ran. Both are called from the worker thread; GTK callers
+    should hop back to the main loop with GLib.idle_add.
+    """
+
+    def __init__(self, cwd, steps, on_line=None, on_done=None):
+        self.cwd = cwd
+        self.steps = steps
+        self.on_line = on_line or (lambda text: None)
+        self.on_done = on_done or (lambda success, phases: None)
+        self.phases = []
+        self.success = None
+        self.cancelled = False
+        self.process = None
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        self.thread.join(timeout)
+        return self.success
+
+    def cancel(self):
+        """Stop the running step and skip the rest"""
+        with self.lock:
+            self.cancelled = True
+            process = self.process
+        if process and process.poll() is None:
+            try:
+                # Steps run in their own session so make's children go too
+                os.killpg(process.pid, signal.SIGTERM)
+            except (ProcessLookupError, PermissionError):
+                process.terminate()
+
+    def run(self):
+        success = True
+        for step in self.steps:
+            name, argv, stdin_text = (*step, None)[:3]
+            with self.lock:
+                if self.cancelled:
+                    success = False
+                    break
+            self.on_line(f"==> {name}: {' '.join(argv)}\n")
+            started = time.monotonic()
+            try:
+                returncode = self.run_step(argv, stdin_text)
+            except OSError as e:
+                self.on_line(f"Error: {e}\n")
+                returncode = -1
+            elapsed = time.monotonic() - started
+            self.phases.append((name, returncode, elapsed))
+            self.on_line(f"==> {name} exited {returncode} after {elapsed:.1f}s\n")
+            if returncode != 0:
+                success = False
+                break
+        if self.cancelled:
+            self.on_line("==> Build cancelled\n")
+            success = False
+        self.success = success
+        self.on_done(success, self.phases)
+
+    def run_step(self, argv, stdin_text):
+        with self.lock:
+            if self.cancelled:
+                return -signal.SIGTERM
+            self.process = subprocess.Popen(
+                argv,
+                cwd=self.cwd,
+                stdin=subprocess.PIPE if stdin_text is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+                start_new_session=True
+            )
+        process = self.process
+        if stdin_text is not None:
+            try:
+                process.stdin.write(stdin_text)
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+        for line in process.stdout:
+            self.on_line(line)
+        return process.wait()
+
+
+# One alternation for everything the config lexer has to step over as a
+# unit; whitespace and operator characters are skipped by finditer itself.
+C_TOKEN_RE = re.compile(
+    rb'(?P<comment>/\*[^*]*\*+(?:[^/*][^*]*\*+)*/|//[^\n]*)'
+    rb'|(?P<pp>^[ \t]*#(?:\\\n|[^\n])*)'
+    rb'|(?P<string>"(?:[^"\\\n]|\\.)*")'
+    rb"|(?P<char>'(?:[^'\\\n]|\\.)*')"
+    rb'|(?P<word>[A-Za-z_0-9][A-Za-z_0-9.]*)'
+    rb'|(?P<punct>[{}\[\]();=*])',
+    re.M
+)
+PP_RE = re.compile(rb'#[ \t]*(\w+)[ \t]*(.*)', re.S)
+PP_DEFINE_RE = re.compile(rb'(\w+)(\([^)]*\))?[ \t]*(.*)', re.S)
+PP_COMMENT_RE = re.compile(rb'\s*(?:/\*.*?\*/|//[^\n]*)\s*$', re.S)
+
+
+def config_type(ctype, declarator, value):
+    """Classify a declaration the way parse_config always has"""
+    words = ctype.split()
+    if '[' in declarator:
+        if 'char' in words:
+            return 'string_array' if '*' in declarator or '*' in ctype else 'string'
+        return 'array'
+    if 'float' in words or 'double' in words:
+        return 'float'
+    if 'int' in words or 'unsigned' in words:
+        return 'int'
+    if 'char' in words and '*' in declarator + ctype and value.startswith('"'):
+        return 'string'
+    return 'other'
+
+
+def lex_config(data, file=None):
+    """Split C config source into declaration and #define entries in one pass.
+
+    data is the raw bytes of config.h, config.def.h or patches.h. Every
+    entry is a dict with name, type (define, macro, int, float, string,
+    string_array, array or other), the C type text, the initializer or macro
+    body as value, `span` - the byte offsets of that value - and `decl`,
+    the span of the whole declaration, plus the 1-based line and `cond`, the
+    #if conditions it sits under. Declarations without an initializer and
+    function bodies are skipped.
+    """
+    entries = []
+    conds = []  # one list of branch expressions per open #if
+    saved = []  # lexer state at each open #if and the depth each branch ended at
+    depth = 0
+    start = None  # first token of the current top-level statement
+    equals = None
+    words = []  # (text, offset, bracket depth) of the statement before '='
+    skip_block = False
+    lines = [0, 1]  # offset and line number of the last lookup, so counting stays linear
+
+    def line_at(pos):
+        if pos >= lines[0]:
+            lines[1] += data.count(b'\n', lines[0], pos)
+        else:
+            lines[1] -= data.count(b'\n', pos, lines[0])
+        lines[0] = pos
+        return lines[1]
+
+    def condition():
+        out = []
+        for branches in conds:
+            *previous, current = branches
+            out.extend(f"!({expr})" for expr in previous if expr is not None)
+            if current is not None:
+                out.append(current)
+        return out
+
+    for m in C_TOKEN_RE.finditer(data):
+        kind = m.lastgroup
+        if kind == 'comment':
+            continue
+        if kind == 'pp':
+            directive = PP_RE.match(m.group().lstrip())
+            if not directive:
+                continue
+            name, rest = directive.group(1), directive.group(2)
+            rest_start = m.start() + len(m.group()) - len(m.group().lstrip()) + directive.start(2)
+            if name in (b'if', b'ifdef', b'ifndef'):
+                expr = PP_COMMENT_RE.sub(b'', rest).decode(errors='replace').strip()
+                expr = {b'ifdef': f"defined({expr})", b'ifndef': f"!defined({expr})"}.get(name, expr)
+                conds.append([expr])
+                saved.append(((depth, start, equals, list(words), skip_block), []))
+            elif name in (b'elif', b'else') and conds:
+                expr = PP_COMMENT_RE.sub(b'', rest).decode(errors='replace').strip()
+                conds[-1].append(expr if name == b'elif' else None)
+                # Branches are alternatives: each starts from the state at #if
+                state, ends = saved[-1]
+                ends.append(depth)
+                depth, start, equals, words, skip_block = state[0], state[1], state[2], list(state[3]), state[4]
+            elif name == b'endif' and conds:
+                branches = conds.pop()
+                state, ends = saved.pop()
+                ends.append(depth)
+                # A group whose branches leave the braces in different states
+                # (an array opened under one flag and never closed) is dropped
+                # as if the preprocessor had skipped it
+                balanced = all(end == state[0] for end in ends)
+                agreed = None in branches and len(set(ends)) == 1
+                if not balanced and not agreed:
+                    depth, start, equals, words, skip_block = state[0], state[1], state[2], list(state[3]), state[4]
+            elif name == b'define' and depth == 0:
+                define = PP_DEFINE_RE.match(rest)
+                if not define:
+                    continue
+                body = PP_COMMENT_RE.sub(b'', define.group(3))
+                value_start = rest_start + define.start(3)
+                value = body.strip()
+                lead = len(body) - len(body.lstrip())
+                entry = {
+                    'name': define.group(1).decode(),
+                    'type': 'macro' if define.group(2) else 'define',
+                    'ctype': '',
+                    'value': value.decode(errors='replace'),
+                    'span': (value_start + lead, value_start + lead + len(value)),
+                    'decl': (m.start(), m.end()),
+                    'line': line_at(m.start()),
+                    'cond': condition(),
+                    'file': file
+                }
+                if define.group(2):
+                    entry['params'] = [p.strip() for p in define.group(2)[1:-1].decode().split(',') if p.strip()]
+                entries.append(entry)
+            continue
+
+        token = m.group()
+        if start is None:
+            start = m.start()
+            equals = None
+            words = []
+        if kind == 'punct':
+            if token in b'{[(':
+                if equals is None and not skip_block:
+                    words.append((token.decode(), m.start(), depth))
+                depth += 1
+                if token == b'{' and depth == 1 and equals is None:
+                    skip_block = True  # function body, enum or struct definition
+                continue
+            if token in b'}])':
+                depth -= 1
+                if skip_block and depth == 0 and token == b'}':
+                    skip_block = False
+                    # A function body ends the statement; an enum/struct wants its ';'
+                    if b'(' in data[start:m.start()].split(b'{', 1)[0]:
+                        start = None
+                elif equals is None:
+                    words.append((token.decode(), m.start(), depth))
+                continue
+            if depth == 0 and token == b'=' and equals is None:
+                equals = m.end()
+                continue
+            if depth == 0 and token == b';':
+                if equals is not None and not skip_block:
+                    entries.append(declaration(data, start, equals, m, words, condition(), file))
+                    entries[-1]['line'] = line_at(start)
+                start = None
+                continue
+        if equals is None and not skip_block:
+            words.append((token.decode(errors='replace'), m.start(), depth))
+    return entries
+
+
+def declaration(data, start, equals, end, words, cond, file):
+    """Build the entry for `ctype declarator = value;`"""
+    value = data[equals:end.start()]
+    lead = len(value) - len(value.lstrip())
+    value = value.strip()
+    # The declared name: the word after "(*" for function pointers,
+    # otherwise the last word outside any brackets
+    name = None
+    type_end = None
+    for i, (text, offset, depth) in enumerate(words):
+        if text == '(' and i + 2 < len(words) and words[i + 1][0] == '*':
+            name, type_end = words[i + 2], offset
+            break
+    if name is None:
+        outside = [w for w in words if w[2] == 0 and re.match(r'[A-Za-z_]\w*$', w[0])]
+        name = outside[-1] if outside else ('', equals, 0)
+    ctype = data[start:type_end or name[1]].decode(errors='replace')
+    declarator = data[name[1]:equals - 1].decode(errors='replace')
+    ctype_words = ' '.join(ctype.replace('*', ' * ').split())
+    text = value.decode(errors='replace')
+    return {
+        'name': name[0],
+        'type': config_type(ctype_words, declarator, text),
+        'ctype': ctype_words,
+        'value': text,
+        'span': (equals + lead, equals + lead + len(value)),
+        'decl': (start, end.end()),
+        'cond': cond,
+        'file': file
+    }
+
+
+def splice(data, edits):
+    """Replace each (start, end) span in data; spans must not overlap"""
+    out = []
+    pos = 0
+    for (start, end), text in sorted(edits):
+        out += [data[pos:start], text]
+        pos = end
+    out.append(data[pos:])
+    return b''.join(out)
+
+
+CPP_TOKEN_RE = re.compile(r'\s*(?:(defined)\s*\(?\s*(\w+)\s*\)?|(\w+)|(&&|\|\||==|!=|<=|>=|<<|>>|[-+*/%!<>()|&^~]))')
+
+
+def cpp_value(expr, macros):
+    """Evaluate a C integer expression; macros maps names to integer values.
+
+    Unknown names are 0 as in cpp. Returns None for anything this can't
+    handle, such as function-like macros or string literals.
+    """
+    out = []
+    pos = 0
+    while pos < len(expr):
+        m = CPP_TOKEN_RE.match(expr, pos)
+        if not m or m.end() == pos:
+            if expr[pos:].strip():
+                return None
+            break
+        pos = m.end()
+        defined, defined_name, word, op = m.groups()
+        if defined:
+            out.append('1' if defined_name in macros else '0')
+        elif word:
+            number = re.fullmatch(r'(0[xX][0-9a-fA-F]+|\d+)[uUlL]*', word)
+            if number:
+                out.append(str(int(number.group(1), 0)))
+            elif expr[pos:].lstrip().startswith('('):
+                return None
+            elif not word[0].isdigit():
+                value = macros.get(word, 0)
+                out.append(str(value) if isinstance(value, int) else '0')
+            else:
+                return None
+        else:
+            out.append({'&&': ' and ', '||': ' or ', '!': ' not ', '/': '//'}.get(op, op))
+    try:
+        return int(eval(''.join(out) or '1', {'__builtins__': {}}, {}))
+    except Exception:
+        return None
+
+
+def cpp_eval(expr, macros):
+    """Evaluate a #if expression; expressions this can't handle count as
+    true, so nothing is hidden because of a parsing gap."""
+    value = cpp_value(expr, macros)
+    return True if value is None else bool(value)
+
+
+def config_macros(entries):
+    """Integer-valued #defines (the patch flags and layouts) from lexed entries"""
+    macros = {}
+    for entry in entries:
+        if entry['type'] == 'define' and entry['value'].isdigit():
+            macros.setdefault(entry['name'], int(entry['value']))
+        elif entry['type'] == 'define':
+            macros.setdefault(entry['name'], None)
+    return macros
+
+
+def active_entry(entries, name, macros):
+    """The declaration of name that the preprocessor would keep, else the first"""
+    found = [entry for entry in entries if entry['name'] == name]
+    for entry in found:
+        if all(cpp_eval(cond, macros) for cond in entry['cond']):
+            return entry
+    return found[0] if found else None
+
+
+INIT_TOKEN_RE = re.compile(
+    r'(?P<comment>/\*.*?\*/|//[^\n]*)'
+    r'|(?P<pp>^[ \t]*#(?:\\\n|[^\n])*)'
+    r'|(?P<string>"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\')'
+    r'|(?P<punct>[{}(),])',
+    re.S | re.M
+)
+MACRO_CALL_RE = re.compile(r'([A-Za-z_]\w*)\s*\((.*)\)\Z', re.S)
+X_MODIFIERS = {
+    'ShiftMask': 1, 'LockMask': 2, 'ControlMask': 4, 'Mod1Mask': 8,
+    'Mod2Mask': 16, 'Mod3Mask': 32, 'Mod4Mask': 64, 'Mod5Mask': 128
+}
+CHORD_MODIFIERS = {
+    'shift': 'ShiftMask', 'ctrl': 'ControlMask', 'control': 'ControlMask',
+    'alt': 'Mod1Mask', 'mod1': 'Mod1Mask', 'mod2': 'Mod2Mask', 'mod3': 'Mod3Mask',
+    'super': 'Mod4Mask', 'win': 'Mod4Mask', 'mod4': 'Mod4Mask', 'mod5': 'Mod5Mask',
+    'mod': 'MODKEY'
+}
+
+
+def split_initializer(text):
+    """Split the body of a brace initializer into top-level elements.
+
+    Yields (element, cond, span) where cond lists the #if expressions the
+    element sits under inside the array and span is the (start, end) of
+    its text, without the comma. Comments are dropped, and a macro call
+    such as TAGKEYS(XK_1, 0) is an element of its own even without a
+    trailing comma.
+    """
+    conds = []
+    depth = 0
+    start = 0
+    parts = []
+    first = None  # where the current element's own text starts and ends
+    last = None
+    pos = 0
+
+    def condition():
+        out = []
+        for branches in conds:
+            *previous, current = branches
+            out.extend(f"!({expr})" for expr in previous if expr is not None)
+            if current is not None:
+                out.append(current)
+        return out
+
+    def flush(end):
+        nonlocal first
+        parts.append(text[start:end])
+        element = ' '.join(''.join(parts).split())
+        parts.clear()
+        span = (first, last)
+        first = None
+        return element, span
+
+    for m in INIT_TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        gap = text[pos:m.start()]
+        if gap.strip():
+            if first is None:
+                first = pos + len(gap) - len(gap.lstrip())
+            last = pos + len(gap.rstrip())
+        pos = m.end()
+        if kind == 'string' or (kind == 'punct' and not (m.group() == ',' and depth == 0)):
+            if first is None:
+                first = m.start()
+            last = m.end()
+        if kind == 'string':
+            continue
+        if kind == 'comment' or kind == 'pp':
+            parts.append(text[start:m.start()] + ' ')
+            start = m.end()
+            if kind == 'pp' and depth == 0:
+                directive = re.match(r'\s*#\s*(\w+)\s*(.*)', m.group(), re.S)
+                name = directive.group(1)
+                expr = re.sub(r'/\*.*?\*/|//.*', '', directive.group(2).replace('\\\n', ' ')).strip()
+                if name in ('if', 'ifdef', 'ifndef'):
+                    conds.append([{'ifdef': f"defined({expr})", 'ifndef': f"!defined({expr})"}.get(name, expr)])
+                elif name in ('elif', 'else') and conds:
+                    conds[-1].append(expr if name == 'elif' else None)
+                elif name == 'endif' and conds:
+                    conds.pop()
+            continue
+        char = m.group()
+        if char in '{(':
+            depth += 1
+        elif char in '})':
+            depth -= 1
+            if depth == 0:
+                element, span = flush(m.end())
+                start = m.end()
+                if element:
+                    yield element, condition(), span
+        elif char == ',' and depth == 0:
+            element, span = flush(m.start())
+            start = m.end()
+            if element:
+                yield element, condition(), span
+    gap = text[pos:]
+    if gap.strip():
+        if first is None:
+            first = pos + len(gap) - len(gap.lstrip())
+        last = pos + len(gap.rstrip())
+    element, span = flush(len(text))
+    if element:
+        yield element, condition(), span
+
+
+def array_elements(entry):
+    """split_initializer over an array entry, with spans as byte offsets into
+    its value, so they stay valid when text before the array changes"""
+    body = entry['value'][1:-1]
+    for element, cond, (start, end) in split_initializer(body):
+        yield element, cond, (1 + len(body[:start].encode()), 1 + len(body[:end].encode()))
+
+
+ELEMENT_COMMA_RE = re.compile(rb'[ \t]*,')
+
+
+def element_edit(data, span, elements):
+    """The (span, text) edit replacing the array element at span with elements.
+
+    Several elements go one per line at the original indentation. With no
+    elements the element is removed with its comma, and with its line when
+    nothing else is on it. Macro calls such as TAGKEYS(XK_1, 0) or RULE(...)
+    expand to their own trailing commas, so they get none here.
+    """
+    start, end = span
+    line_start = data.rfind(b'\n', 0, start) + 1
+    indent = data[line_start:start]
+    comma = ELEMENT_COMMA_RE.match(data, end)
+    if not elements:
+        if comma:
+            end = comma.end()
+        line_end = data.find(b'\n', end)
+        line_end = len(data) if line_end == -1 else line_end + 1
+        if not indent.strip() and not data[end:line_end].strip():
+            return (line_start, line_end), b''
+        return (start, end), b''
+    newline = b'\n' + indent if not indent.strip() else b' '
+    text = b''.join(element + (b',' if element.endswith(b'}') else b'') + newline
+                    for element in elements[:-1]) + elements[-1]
+    if not comma and data[start:end].endswith(b')') and elements[-1].endswith(b'}'):
+        text += b','
+    return (start, end), text
+
+
+def element_list(elements, indent):
+    """New array elements, one per line, with commas where they need one"""
+    return b''.join(indent + element + (b',' if element.endswith(b'}') else b'') + b'\n'
+                    for element in elements)
+
+
+def array_edits(data, entry, replaced, added):
+    """Splice edits for an array: replaced maps element spans (as from
+    array_elements) to their new element texts, [] deleting the element;
+    added are appended before the closing brace"""
+    base = entry['span'][0]
+    edits = dict(element_edit(data, (base + start, base + end), elements)
+                 for (start, end), elements in replaced.items())
+    if added:
+        kept = [(base + start, base + end) for _, _, (start, end) in array_elements(entry)
+                if replaced.get((start, end)) != []]
+        close = entry['span'][1] - 1
+        line_start = data.rfind(b'\n', 0, close) + 1
+        if kept:
+            last = kept[-1]
+            indent = data[data.rfind(b'\n', 0, last[0]) + 1:last[0]]
+            if not ELEMENT_COMMA_RE.match(data, last[1]) and data[last[0]:last[1]].endswith(b'}'):
+                # the last element needs a comma before the new ones
+                if last in edits:
+                    edits[last] += b','
+                else:
+                    edits[(last[1], last[1])] = b','
+        else:
+            indent = b'\t'
+        if indent.strip():
+            indent = b'\t'
+        if data[line_start:close].strip():
+            edits[(close, close)] = b' ' + element_list(added, b'').replace(b'\n', b' ')
+        else:
+            edits[(line_start, line_start)] = element_list(added, indent)
+    return list(edits.items())
+
+
+def split_fields(element):
+    """The top-level comma separated fields of `{ a, b, {c, d} }`"""
+    inner = element.strip()
+    if inner.startswith('{') and inner.endswith('}'):
+        inner = inner[1:-1]
+    fields = []
+    depth = 0
+    start = 0
+    for m in INIT_TOKEN_RE.finditer(inner):
+        char = m.group()
+        if m.lastgroup != 'punct':
+            continue
+        if char in '{(':
+            depth += 1
+        elif char in '})':
+            depth -= 1
+        elif depth == 0:
+            fields.append(inner[start:m.start()].strip())
+            start = m.end()
+    last = inner[start:].strip()
+    if last:
+        fields.append(last)
+    return fields
+
+
+def expand_macro(element, definitions):
+    """Expand a function-like macro call, or return None"""
+    call = MACRO_CALL_RE.match(element)
+    if not call:
+        return None
+    entry = definitions.get(call.group(1))
+    if not entry or entry['type'] != 'macro':
+        return None
+    args = split_fields('{' + call.group(2) + '}')
+    params = dict(zip(entry.get('params', []), args))
+    body = entry['value'].replace('\\\n', ' ')
+    body = re.sub(r'\b[A-Za-z_]\w*\b', lambda m: params.get(m.group(), m.group()), body)
+    return re.sub(r'\s*##\s*', '', body)
+
+
+def display_argument(arg):
+    """The readable part of a binding argument: SHCMD("x") -> x, {.i = +1} -> +1"""
+    shcmd = re.fullmatch(r'SHCMD\(\s*"(.*)"\s*\)', arg, re.S)
+    if shcmd:
+        return shcmd.group(1)
+    union = re.fullmatch(r'\{\s*(?:\.\w+\s*=\s*)?(.*?)\s*\}', arg, re.S)
+    return union.group(1) if union else arg
+
+
+class Keymap:
+    """keys[] and buttons[] as bindings, indexed by (modifier mask, keysym).
+
+    Macros such as TAGKEYS, STACKKEYS and MODKEY are expanded with the
+    definitions the preprocessor would pick, and elements under a disabled
+    #if are listed in `inactive`. Each binding carries the byte span of the
+    array element it came from, so writers can edit that element in place.
+    """
+
+    def __init__(self, definitions, macros):
+        self.definitions = definitions
+        self.macros = macros
+        self.keys = []
+        self.buttons = []
+        self.inactive = []
+        self.by_chord = {}
+        self.by_click = {}
+        self.sources = {}  # array name -> the initializer the spans point into
+        for name, fields in (('keys', 4), ('buttons', 5)):
+            entry = definitions.get(name)
+            if entry and entry['type'] == 'array':
+                self.sources[name] = entry['value']
+                for element, cond, span in array_elements(entry):
+                    if not all(cpp_eval(expr, self.macros) for expr in cond):
+                        self.inactive.append((cond, element))
+                        continue
+                    self.parse(element, fields, cond, None, span)
+
+    def parse(self, element, size, cond, macro, span):
+        expanded = expand_macro(element, self.definitions)
+        if expanded is not None:
+            for inner, inner_cond, _ in split_initializer(expanded):
+                if all(cpp_eval(expr, self.macros) for expr in inner_cond):
+                    self.parse(inner, size, cond + inner_cond, macro or element, span)
+            return
+        fields = split_fields(element)
+        if len(fields) != size:
+            return
+        if size == 4:
+            self.add_key(fields, cond, macro, span)
+        else:
+            self.add_button(fields, cond, macro, span)
+
+    def resolve(self, word, seen=()):
+        """Follow object-like #defines: MODKEY -> Mod4Mask"""
+        entry = self.definitions.get(word)
+        if entry and entry['type'] == 'define' and word not in seen:
+            return self.resolve(entry['value'].strip(), seen + (word,))
+        return word
+
+    def mask(self, expr):
+        """Modifier expression -> X11 mask, or the normalised text if unknown"""
+        value = 0
+        for part in expr.replace('(', ' ').replace(')', ' ').split('|'):
+            part = self.resolve(part.strip())
+            if '|' in part:
+                sub = self.mask(part)
+                if isinstance(sub, str):
+                    return '|'.join(sorted(expr.split()))
+                value |= sub
+            elif part in X_MODIFIERS:
+                value |= X_MODIFIERS[part]
+            elif part.isdigit():
+                value |= int(part)
+            else:
+                return '|'.join(sorted(expr.split()))
+        return value
+
+    def chord(self, mod, key):
+        return (self.mask(mod), self.resolve(key.strip()))
+
+    def add_key(self, fields, cond, macro, span=None):
+        mod, key, func, arg = fields
+        binding = {
+            'mod': mod,
+            'key': key,
+            'function': func,
+            'argument': arg,
+            'cond': cond,
+            'macro': macro,
+            'span': span,
+            'chord': self.chord(mod, key)
+        }
+        self.keys.append(binding)
+        self.by_chord.setdefault(binding['chord'], []).append(binding)
+
+    def add_button(self, fields, cond, macro, span=None):
+        click, mod, button, func, arg = fields
+        binding = {
+            'click': click,
+            'mod': mod,
+            'button': button,
+            'function': func,
+            'argument': arg,
+            'cond': cond,
+            'macro': macro,
+            'span': span
+        }
+        self.buttons.append(binding)
+        self.by_click.setdefault((click, self.mask(mod), button), []).append(binding)
+
+    def find(self, mod, key):
+        """Bindings already on the chord mod+key"""
+        return self.by_chord.get(self.chord(mod, key), [])
+
+    def lookup(self, text):
+        """What a chord such as Mod+Shift+x or Super+Return does"""
+        *mods, key = [part.strip() for part in text.split('+')] if text.strip() else ['']
+        names = [CHORD_MODIFIERS.get(mod.lower(), mod) for mod in mods]
+        mod = '|'.join(names) or '0'
+        if key and not key.startswith('XK_'):
+            key = 'XK_' + key
+        return self.find(mod, key)
+
+    def conflicts(self):
+        """Chords bound more than once, keys then buttons"""
+        return ([bindings for bindings in self.by_chord.values() if len(bindings) > 1] +
+                [bindings for bindings in self.by_click.values() if len(bindings) > 1])
+
+
+# Positional Rule fields in dwm-flexipatch's struct order, with the patch
+# that adds each optional one
+RULE_FIELDS = [
+    ('class', None), ('role', 'WINDOWROLERULE_PATCH'), ('instance', None), ('title', None),
+    ('wintype', None), ('tags', None), ('switchtag', 'SWITCHTAG_PATCH'),
+    ('iscentered', 'CENTER_PATCH'), ('isfloating', None),
+    ('isfakefullscreen', 'SELECTIVEFAKEFULLSCREEN_PATCH && FAKEFULLSCREEN_CLIENT_PATCH && !FAKEFULLSCREEN_PATCH'),
+    ('isfreesize', 'SIZEHINTS_ISFREESIZE_PATCH'), ('ispermanent', 'ISPERMANENT_PATCH'),
+    ('isterminal', 'SWALLOW_PATCH'), ('noswallow', 'SWALLOW_PATCH'), ('floatpos', 'FLOATPOS_PATCH'),
+    ('monitor', None), ('scratchkey', 'RENAMED_SCRATCHPADS_PATCH'), ('unmanaged', 'UNMANAGED_PATCH'),
+    ('xkb_layout', 'XKB_PATCH')
+]
+VANILLA_RULE_FIELDS = ['class', 'instance', 'title', 'tags', 'isfloating', 'monitor']
+RULE_STRINGS = ('class', 'role', 'instance', 'title', 'wintype')
+
+
+class RuleSet:
+    """rules[] as structured rules plus a simulator of dwm's applyrules().
+
+    Every string field matches with strstr, so any three characters of a
+    pattern must occur in a matching window. Each rule is indexed under the
+    rarest such gram of its patterns and a window only checks the rules
+    whose gram occurs in its class, instance, title or role.
+    """
+
+    def __init__(self, definitions, macros, flexipatch=True):
+        self.definitions = definitions
+        self.macros = macros
+        if flexipatch:
+            self.order = [name for name, flag in RULE_FIELDS if flag is None or cpp_eval(flag, macros)]
+        else:
+            self.order = VANILLA_RULE_FIELDS
+        self.rules = []
+        self.inactive = []
+        self.source = None
+        entry = definitions.get('rules')
+        if entry and entry['type'] == 'array':
+            self.source = entry['value']
+            for element, cond, span in array_elements(entry):
+                if not all(cpp_eval(expr, macros) for expr in cond):
+                    self.inactive.append((cond, element))
+                    continue
+                fields = self.parse_rule(element)
+                if fields is not None:
+                    self.add(fields, element, span)
+        self.build_index()
+
+    def parse_rule(self, element):
+        """Raw field text by name for `{ "Gimp", ... }`, `{ .class = ... }` or RULE(...)"""
+        call = MACRO_CALL_RE.match(element)
+        if call and call.group(1) == 'RULE':
+            element = '{' + call.group(2) + '}'
+        elif call or not element.startswith('{'):
+            return None
+        values = split_fields(element)
+        if values and all(value.startswith('.') for value in values):
+            fields = {}
+            for value in values:
+                name, _, raw = value[1:].partition('=')
+                fields[name.strip()] = raw.strip()
+            return fields
+        return dict(zip(self.order, values))
+
+    @staticmethod
+    def defaults(rule):
+        """Values of fields a rule leaves out; dwm.c defines
+        RULE(...) as { .monitor = -1, __VA_ARGS__ }"""
+        return {'monitor': '-1', 'xkb_layout': '-1'} if rule['macro'] else {}
+
+    def text(self, raw):
+        """A string field's value; None for NULL or a missing field"""
+        raw = self.resolve(raw)
+        if not raw or raw in ('NULL', '0'):
+            return None
+        strings = re.findall(r'"((?:[^"\\]|\\.)*)"', raw)
+        return ''.join(strings) if strings else raw
+
+    def number(self, raw, default=0):
+        if raw is None:
+            return default
+        value = cpp_value(self.resolve(raw), self.macros)
+        return default if value is None else value
+
+    def resolve(self, raw, seen=()):
+        entry = self.definitions.get(raw.strip()) if raw else None
+        if entry and entry['type'] == 'define' and raw not in seen:
+            return self.resolve(entry['value'].strip(), seen + (raw,))
+        return raw
+
+    def add(self, fields, element, span=None):
+        rule = {name: self.text(fields.get(name)) for name in RULE_STRINGS}
+        rule.update({
+            'index': len(self.rules),
+            'fields': fields,
+            'source': element,
+            'span': span,
+            'macro': element.startswith('RULE(')
+        })
+        defaults = self.defaults(rule)
+        for name in ('tags', 'isfloating', 'monitor'):
+            rule[name] = self.number(fields.get(name, defaults.get(name)))
+        self.rules.append(rule)
+
+    @staticmethod
+    def grams(pattern):
+        if len(pattern) <= 3:
+            return {pattern}
+        return {pattern[i:i + 3] for i in range(len(pattern) - 2)}
+
+    def build_index(self):
+        self.index = {name: {} for name in RULE_STRINGS if name != 'wintype'}
+        self.sizes = {name: set() for name in self.index}
+        self.always = []
+        counts = {}
+        for rule in self.rules:
+            for name in self.index:
+                for gram in self.grams(rule[name] or ''):
+                    counts[name, gram] = counts.get((name, gram), 0) + 1
+        for rule in self.rules:
+            keys = [(name, gram) for name in self.index if rule[name] for gram in self.grams(rule[name])]
+            if not keys:
+                self.always.append(rule['index'])
+                continue
+            name, gram = min(keys, key=lambda key: (counts[key], -len(key[1])))
+            self.index[name].setdefault(gram, []).append(rule['index'])
+            self.sizes[name].add(len(gram))
+
+    def candidates(self, window):
+        found = set(self.always)
+        for name, grams in self.index.items():
+            value = window.get(name) or ''
+            for size in self.sizes[name]:
+                for i in range(len(value) - size + 1):
+                    hit = grams.get(value[i:i + size])
+                    if hit:
+                        found.update(hit)
+        return sorted(found)
+
+    @staticmethod
+    def matches(rule, window):
+        for name in RULE_STRINGS:
+            pattern = rule[name]
+            if pattern is None:
+                continue
+            if name == 'wintype':
+                if window.get('wintype') != pattern:
+                    return False
+            elif pattern not in (window.get(name) or ''):
+                return False
+        return True
+
+    def apply(self, window, candidates=None):
+        """Rules that fire for window, in order, and what the client ends up with"""
+        if candidates is None:
+            candidates = self.candidates(window)
+        fired = [i for i in candidates if self.matches(self.rules[i], window)]
+        result = {'tags': 0, 'isfloating': 0, 'monitor': -1}
+        for i in fired:
+            rule = self.rules[i]
+            # applyrules overwrites isfloating, ORs tags and only moves the
+            # client when the rule names a monitor
+            result['isfloating'] = rule['isfloating']
+            result['tags'] |= rule['tags']
+            if rule['monitor'] != -1:
+                result['monitor'] = rule['monitor']
+        return fired, result
+
+    def simulate(self, windows):
+        """Run apply over a batch of window dicts, timing each one"""
+        report = []
+        for window in windows:
+            start = time.perf_counter()
+            candidates = self.candidates(window)
+            fired, result = self.apply(window, candidates)
+            report.append({
+                'window': window,
+                'fired': fired,
+                'result': result,
+                'checked': len(candidates),
+                'usec': (time.perf_counter() - start) * 1e6
+            })
+        return report
+
+    def subsumes(self, later, rule):
+        """Whether every window matching rule also matches later"""
+        for name in RULE_STRINGS:
+            pattern = later[name]
+            if pattern is None:
+                continue
+            if rule[name] is None:
+                return False
+            if name == 'wintype' and pattern != rule[name]:
+                return False
+            if pattern not in rule[name]:
+                return False
+        return True
+
+    def shadowed(self):
+        """(rule, later rule) pairs where the later one undoes all of the first.
+
+        A later match overwrites isfloating and the per-patch flags, so a rule
+        is dead when a later rule matches all its windows, already sets its
+        tags and either names a monitor itself or the first one doesn't.
+        """
+        pairs = []
+        for rule in self.rules:
+            for later in self.rules[rule['index'] + 1:]:
+                if (self.subsumes(later, rule)
+                        and rule['tags'] & ~later['tags'] == 0
+                        and (rule['monitor'] == -1 or later['monitor'] != -1)):
+                    pairs.append((rule['index'], later['index']))
+                    break
+        return pairs
+
+
+def read_windows(path):
+    """Windows from a tab separated class/instance/title/role dump, '-' for stdin"""
+    handle = sys.stdin if path == '-' else open(path)
+    windows = []
+    with handle:
+        for line in handle:
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'):
+                continue
+            values = line.split('\t') + [''] * 4
+            windows.append(dict(zip(('class', 'instance', 'title', 'role'), values)))
+    return windows
+
+
+def live_windows():
+    """Class, instance, title and role of every client on the running X display"""
+    windows = []
+    try:
+        root = subprocess.run(['xprop', '-root', '_NET_CLIENT_LIST'],
+                              capture_output=True, text=True, timeout=5).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return windows
+    for wid in re.findall(r'0x[0-9a-f]+', root):
+        props = subprocess.run(['xprop', '-id', wid, 'WM_CLASS', '_NET_WM_NAME', 'WM_WINDOW_ROLE'],
+                               capture_output=True, text=True).stdout
+        hint = re.search(r'WM_CLASS\(STRING\) = "(.*?)", "(.*?)"', props)
+        title = re.search(r'_NET_WM_NAME\(\w+\) = "(.*)"', props)
+        role = re.search(r'WM_WINDOW_ROLE\(STRING\) = "(.*)"', props)
+        windows.append({
+            'class': hint.group(2) if hint else 'broken',
+            'instance': hint.group(1) if hint else 'broken',
+            'title': title.group(1) if title else '',
+            'role': role.group(1) if role else ''
+        })
+    return windows
+
+
+def simulate_rules(config, windows):
+    """Print which rules fire for each window, the cost, and shadowed rules"""
+    rules = config.ruleset
+    print(f"{len(rules.rules)} rules, {len(windows)} windows")
+    used = set()
+    for entry in rules.simulate(windows):
+        used.update(entry['fired'])
+        window = entry['window']
+        result = entry['result']
+        fired = ', '.join(str(i) for i in entry['fired']) or '-'
+        print(f"{window['class']!r} {window['instance']!r} {window['title']!r}: rules {fired}"
+              f" -> tags {result['tags']:#x} floating {result['isfloating']} monitor {result['monitor']}"
+              f" ({entry['checked']}/{len(rules.rules)} checked, {entry['usec']:.1f} us)")
+    for i, j in rules.shadowed():
+        print(f"rule {i} {rules.rules[i]['source']} is shadowed by rule {j} {rules.rules[j]['source']}")
+    unused = [rule['index'] for rule in rules.rules if rule['index'] not in used]
+    if windows and unused:
+        print(f"never fired: {', '.join(map(str, unused))}")
+
+
 class DWMConfig:
     """Handles DWM configuration parsing and management"""
 
@@ -154,26 +1481,29 @@ class DWMConfig:
             print(f"Error creating patches file: {e}")
 
     def parse_config(self):
-        """Parse configuration from config.h/config.def.h"""
+        """Parse configuration from config.h/config.def.h.
+
+        Each file is lexed once (see lex_config). config.h is what gets
+        compiled, so its entries win over config.def.h; of several #if
+        alternatives the one enabled by patches.h is used.
+        """
         config = {}
+        self.config_entries = {}
         if not self.config_files:
             return config
 
-        patterns = [
-            (r'#define\s+(\w+)\s+(.+?)(?:/\*.*\*/)?(?:\n|$)', 'define'),
-            (r'static\s+(?:const\s+)?(?:unsigned\s+)?int\s+(\w+)\s*=\s*(.+?);', 'int'),
-            (r'static\s+const\s+char\s+(\w+)\[\]\s*=\s*"([^"]+)";', 'string'),
-            (r'static\s+const\s+char\s+\*(\w+)\[\]\s*=\s*\{([^}]+)\}', 'string_array'),
-            (r'static\s+float\s+(\w+)\s*=\s*(.+?);', 'float'),
-        ]
-
-        for file_content in self.config_files.values():
-            for pattern, type_ in patterns:
-                for match in re.finditer(pattern, file_content, re.MULTILINE):
-                    key = match.group(1)
-                    value = match.group(2).strip()
-                    config[key] = {'value': value, 'type': type_}
-
+        for name, content in self.config_files.items():
+            self.config_entries[name] = lex_config(content.encode(), name)
+        macros = config_macros(self.config_entries.get('patches.h', []))
+        for entries in self.config_entries.values():
+            macros.update((k, v) for k, v in config_macros(entries).items() if k not in macros)
+
+        for name in ('config.h', 'config.def.h', 'patches.h'):
+            entries = self.config_entries.get(name, [])
+            for key in dict.fromkeys(entry['name'] for entry in entries):
+                if key not in config:
+                    config[key] = active_entry(entries, key, macros)
+        self.macros = macros
         return config
 
     def organize_config(self):
@@ -224,42 +1554,13 @@ class DWMConfig:
 
     def parse_keybinds(self):
         """Parse keyboard shortcuts from config"""
+        self.keymap = Keymap(self.config, getattr(self, 'macros', {}))
         keybinds = []
-        if not self.config_files:
-            return keybinds
-
-        pattern = r'{\s*([^,]+),\s*([^,]+),\s*([^,]+),\s*(?:{?\.?i?\s*=\s*)?([^}]+)}\s*},'
-        for file_content in self.config_files.values():
-            # Find the keys[] array
-            keys_array = re.search(r'static\s+Key\s+keys\[\]\s*=\s*\{([^;]+)\};', file_content, re.DOTALL)
-            if not keys_array:
-                continue
-
-            keys_content = keys_array.group(1)
-            for match in re.finditer(pattern, keys_content):
-                mod = match.group(1).strip()
-                key = match.group(2).strip()
-                func = match.group(3).strip()
-                arg = match.group(4).strip()
-
-                # Extract shell commands
-                if 'SHCMD' in arg:
-                    arg_search = re.search(r'SHCMD\("(.+?)"\)', arg)
-                    if arg_search:
-                        arg = arg_search.group(1)
-
-                # Create a more readable description
-                description = self.get_keybind_description(func, arg)
-
-                keybind = {
-                    'mod': mod,
-                    'key': key,
-                    'function': func,
-                    'argument': arg,
-                    'description': description
-                }
-                keybinds.append(keybind)
-
+        for binding in self.keymap.keys:
+            keybind = dict(binding)
+            keybind['description'] = self.get_keybind_description(
+                binding['function'], display_argument(binding['argument']))
+            keybinds.append(keybind)
         return keybinds
 
     def get_keybind_description(self, func, arg):
@@ -289,36 +1590,20 @@ class DWMConfig:
 
     def parse_rules(self):
         """Parse window rules from config"""
+        self.ruleset = RuleSet(self.config, getattr(self, 'macros', {}), 'patches.h' in self.config_files)
         rules = []
-        if not self.config_files:
-            return rules
-
-        pattern = r'{\s*([^,]+),\s*([^,]+),\s*([^,]+),\s*([^,]+),\s*([^,]+),\s*([^,]+)(?:,\s*([^}]+))?\s*},'
-        for file_content in self.config_files.values():
-            # Find the rules[] array
-            rules_array = re.search(r'static\s+Rule\s+rules\[\]\s*=\s*\{([^;]+)\};', file_content, re.DOTALL)
-            if not rules_array:
-                continue
-
-            rules_content = rules_array.group(1)
-            for match in re.finditer(pattern, rules_content):
-                class_name = match.group(1).strip().strip('"')
-                instance = match.group(2).strip().strip('"')
-                title = match.group(3).strip().strip('"')
-                tags = match.group(4).strip()
-                isfloating = match.group(5).strip()
-                monitor = match.group(6).strip()
-
-                rule = {
-                    'class': class_name,
-                    'instance': instance,
-                    'title': title,
-                    'tags': tags,
-                    'isfloating': isfloating == '1',
-                    'monitor': monitor
-                }
-                rules.append(rule)
-
+        for rule in self.ruleset.rules:
+            rules.append({
+                'class': rule['class'] or '',
+                'instance': rule['instance'] or '',
+                'title': rule['title'] or '',
+                'tags': rule['fields'].get('tags', '0'),
+                'isfloating': bool(rule['isfloating']),
+                'monitor': rule['fields'].get('monitor', str(rule['monitor'])),
+                'fields': rule['fields'],
+                'macro': rule['macro'],
+                'span': rule['span']
+            })
         return rules
 
     def parse_scratchpads(self):
@@ -393,125 +1678,168 @@ class DWMConfig:
                 return False, "No configuration template found"
 
         try:
-            with open(config_path, 'r') as f:
-                content = f.read()
+            with open(config_path, 'rb') as f:
+                data = f.read()
 
-            # Update all config values
+            # Splice changed scalar values into their recorded spans
+            edits = []
+            entries = lex_config(data, 'config.h')
+            macros = getattr(self, 'macros', {})
             for key, value_data in self.config.items():
-                value = value_data['value']
-                type_ = value_data['type']
-
-                if type_ == 'define':
-                    pattern = rf'#define\s+{key}\s+[^\n]+'
-                    replacement = f'#define {key} {value}'
-                elif type_ == 'int':
-                    pattern = rf'static\s+(?:const\s+)?(?:unsigned\s+)?int\s+{key}\s*=\s*[^;]+;'
-                    replacement = f'static const int {key} = {value};'
-                elif type_ == 'string':
-                    pattern = rf'static\s+const\s+char\s+{key}\[\]\s*=\s*"[^"]*";'
-                    replacement = f'static const char {key}[] = "{value}";'
-                elif type_ == 'float':
-                    pattern = rf'static\s+float\s+{key}\s*=\s*[^;]+;'
-                    replacement = f'static float {key} = {value};'
-                else:
+                if value_data['type'] not in ('define', 'int', 'float', 'string'):
                     continue
+                entry = active_entry(entries, key, macros)
+                if not entry or entry['type'] != value_data['type']:
+                    continue
+                value = str(value_data['value']).strip()
+                if entry['type'] == 'string' and not value.startswith('"'):
+                    value = json.dumps(value)
+                if value and value != entry['value']:
+                    edits.append((entry['span'], value.encode()))
 
-                content = re.sub(pattern, replacement, content)
-
-            # Save updated content
-            with open(config_path, 'w') as f:
-                f.write(content)
-
-            self.config_files["config.h"] = content
-            return True, "Configuration saved successfully"
+            if not edits:
+                return True, "No changes to save"
+            self.write_config(splice(data, edits))
+            return True, f"Configuration saved successfully ({len(edits)} changed)"
 
         except Exception as e:
             return False, f"Error saving configuration: {str(e)}"
 
-    def update_keybinds(self, keybinds):
-        """Update keybindings in config.h"""
-        if not self.dwm_path:
-            return False, "DWM path not set"
+    def read_array(self, name, source):
+        """(config.h bytes, live entry of name) for an in-place edit.
 
+        Element spans are only valid for the initializer they were parsed
+        from, source, so an array changed behind our back is refused.
+        Returns an error message instead when the edit can't be done.
+        """
+        if not self.dwm_path:
+            return None, "DWM path not set"
         config_path = os.path.join(self.dwm_path, "config.h")
         if not os.path.exists(config_path):
-            return False, "Configuration file not found"
+            return None, "Configuration file not found"
+        with open(config_path, 'rb') as f:
+            data = f.read()
+        entry = active_entry(lex_config(data, 'config.h'), name, getattr(self, 'macros', {}))
+        if not entry or entry['type'] != 'array':
+            return None, f"{name}[] array not found in configuration"
+        if entry['value'] != source:
+            return None, f"{name}[] in config.h changed since it was loaded, reopen it and try again"
+        return (data, entry), None
+
+    def write_config(self, data):
+        """Atomically replace config.h with data, keeping its mode, and re-parse"""
+        atomic_write(os.path.join(self.dwm_path, "config.h"), data)
+        self.config_files["config.h"] = data.decode()
+        self.config = self.parse_config()
 
-        try:
-            with open(config_path, 'r') as f:
-                content = f.read()
+    @staticmethod
+    def keybind_text(kb):
+        arg = kb['argument']
+        if kb['function'] == 'spawn' and not arg.startswith(("SHCMD", "{")):
+            arg = f'SHCMD("{arg}")'
+        return f'{{ {kb["mod"]}, {kb["key"]}, {kb["function"]}, {arg} }}'.encode()
 
-            # Find the keys[] array
-            keys_array = re.search(r'static\s+Key\s+keys\[\]\s*=\s*\{([^;]+)\};', content, re.DOTALL)
-            if not keys_array:
-                return False, "Keys array not found in configuration"
+    def update_keybinds(self, keybinds):
+        """Update keybindings in config.h.
 
-            # Build new keys array
-            new_keys = "static Key keys[] = {\n"
+        Only the keys[] elements whose bindings were edited or deleted are
+        rewritten, in place; new bindings go at the end of the array.
+        Everything else, #if blocks, comments and alignment included, is
+        left byte-for-byte as it was.
+        """
+        try:
+            found, error = self.read_array('keys', self.keymap.sources.get('keys'))
+            if error:
+                return False, error
+            data, entry = found
+
+            fields = ('mod', 'key', 'function', 'argument')
+            original = {}
+            for binding in self.keymap.keys:
+                original.setdefault(binding['span'], []).append(tuple(binding[f] for f in fields))
+            edited = {span: [] for span in original}
+            added = []
             for kb in keybinds:
-                arg = kb['argument']
-                func = kb['function']
-
-                # Format the argument based on function
-                if func == 'spawn' and not arg.startswith("SHCMD"):
-                    arg = f'SHCMD("{arg}")'
-
-                new_keys += f'\t{{ {kb["mod"]}, {kb["key"]}, {kb["function"]}, {arg} }},\n'
-            new_keys += "};"
-
-            # Replace the keys array
-            new_content = content.replace(keys_array.group(0), new_keys)
-
-            # Save updated content
-            with open(config_path, 'w') as f:
-                f.write(new_content)
+                if kb.get('span') in edited:
+                    edited[kb['span']].append(kb)
+                else:
+                    added.append(self.keybind_text(kb))
+
+            # A TAGKEYS(...) call with one binding changed is written out as
+            # its remaining bindings
+            replaced = {
+                span: [self.keybind_text(kb) for kb in rows]
+                for span, rows in edited.items()
+                if [tuple(kb[f] for f in fields) for kb in rows] != original[span]
+            }
+            if not replaced and not added:
+                return True, "No changes to save"
 
-            self.config_files["config.h"] = new_content
-            self.categories['Keybinds'] = keybinds
-            return True, "Keybindings updated successfully"
+            self.write_config(splice(data, array_edits(data, entry, replaced, added)))
+            self.categories['Keybinds'] = self.parse_keybinds()
+            return True, f"Keybindings updated successfully ({len(replaced) + len(added)} changed)"
 
         except Exception as e:
             return False, f"Error updating keybindings: {str(e)}"
 
-    def update_rules(self, rules):
-        """Update window rules in config.h"""
-        if not self.dwm_path:
-            return False, "DWM path not set"
+    def rule_text(self, rule):
+        """C source for a rule edited on the rules page.
 
-        config_path = os.path.join(self.dwm_path, "config.h")
-        if not os.path.exists(config_path):
-            return False, "Configuration file not found"
-
-        try:
-            with open(config_path, 'r') as f:
-                content = f.read()
+        Designated initializers fit any Rule layout; fields the page
+        doesn't show (role, scratchkey, isterminal...) are carried over.
+        """
+        fields = dict(rule.get('fields') or {})
+        for name in ('class', 'instance', 'title'):
+            if not rule[name]:
+                fields.pop(name, None)
+            elif self.ruleset.text(fields.get(name)) != rule[name]:
+                fields[name] = json.dumps(rule[name])
+        # New rules use RULE() where dwm.c has it, i.e. with flexipatch
+        macro = rule.get('macro')
+        if macro is None:
+            macro = 'patches.h' in self.config_files
+        defaults = RuleSet.defaults({'macro': macro})
+        values = {
+            'tags': str(rule['tags'] or 0),
+            'isfloating': "1" if rule.get("isfloating", False) else "0",
+            'monitor': str(rule['monitor'])
+        }
+        for name, value in values.items():
+            if name in fields or value != defaults.get(name, '0'):
+                fields[name] = value
+        body = ", ".join(f".{name} = {value}" for name, value in fields.items())
+        return (f'RULE({body})' if macro else f'{{ {body} }}').encode()
 
-            # Find the rules[] array
-            rules_array = re.search(r'static\s+Rule\s+rules\[\]\s*=\s*\{([^;]+)\};', content, re.DOTALL)
-            if not rules_array:
-                return False, "Rules array not found in configuration"
+    def update_rules(self, rules):
+        """Update window rules in config.h.
 
-            # Build new rules array
-            new_rules = "static Rule rules[] = {\n"
+        Like update_keybinds, only edited or deleted rules[] elements are
+        rewritten in place and new rules are appended.
+        """
+        try:
+            found, error = self.read_array('rules', self.ruleset.source)
+            if error:
+                return False, error
+            data, entry = found
+
+            shown = ('class', 'instance', 'title', 'tags', 'isfloating', 'monitor')
+            loaded = {rule['span']: rule for rule in self.categories['Rules']}
+            replaced = {span: [] for span in loaded}
+            added = []
             for rule in rules:
-                class_name = f'"{rule["class"]}"' if rule["class"] else "NULL"
-                instance = f'"{rule["instance"]}"' if rule["instance"] else "NULL"
-                title = f'"{rule["title"]}"' if rule["title"] else "NULL"
-                isfloating = "1" if rule.get("isfloating", False) else "0"
-
-                new_rules += f'\t{{ {class_name}, {instance}, {title}, {rule["tags"]}, {isfloating}, {rule["monitor"]} }},\n'
-            new_rules += "};"
-
-            # Replace the rules array
-            new_content = content.replace(rules_array.group(0), new_rules)
-
-            # Save updated content
-            with open(config_path, 'w') as f:
-                f.write(new_content)
+                before = loaded.get(rule.get('span'))
+                if before is None:
+                    added.append(self.rule_text(rule))
+                elif any(str(rule[name]) != str(before[name]) for name in shown):
+                    replaced[rule['span']] = [self.rule_text(rule)]
+                else:
+                    del replaced[rule['span']]
+            if not replaced and not added:
+                return True, "No changes to save"
 
-            self.config_files["config.h"] = new_content
-            self.categories['Rules'] = rules
-            return True, "Window rules updated successfully"
+            self.write_config(splice(data, array_edits(data, entry, replaced, added)))
+            self.categories['Rules'] = self.parse_rules()
+            return True, f"Window rules updated successfully ({len(replaced) + len(added)} changed)"
 
         except Exception as e:
             return False, f"Error updating window rules: {str(e)}"
@@ -526,24 +1854,21 @@ class DWMConfig:
             return False, "Configuration file not found"
 
         try:
-            with open(config_path, 'r') as f:
-                content = f.read()
+            with open(config_path, 'rb') as f:
+                data = f.read()
 
-            # Update each scratchpad command
+            entries = lex_config(data, 'config.h')
+            edits = []
             for scratchpad in scratchpads:
-                name = scratchpad['name']
-                command = scratchpad['command']
-
-                pattern = rf'static\s+const\s+char\s+\*{name}\[\]\s*=\s*\{{\s*"[^"]+"\s*\}};'
-                replacement = f'static const char *{name}[] = {{ "{command}" }};'
-
-                content = re.sub(pattern, replacement, content)
-
-            # Save updated content
-            with open(config_path, 'w') as f:
-                f.write(content)
-
-            self.config_files["config.h"] = content
+                entry = active_entry(entries, scratchpad['name'], getattr(self, 'macros', {}))
+                # Only single-command arrays, argument lists are left alone
+                if entry and re.fullmatch(r'\{\s*"[^"]+"\s*\}', entry['value']):
+                    value = f'{{ "{scratchpad["command"]}" }}'
+                    if value != entry['value']:
+                        edits.append((entry['span'], value.encode()))
+
+            if edits:
+                self.write_config(splice(data, edits))
             self.categories['Scratchpads'] = scratchpads
             return True, "Scratchpads updated successfully"
 
@@ -577,51 +1902,47 @@ class DWMConfig:
         except Exception as e:
             return False, f"Error updating autostart script: {str(e)}"
 
-    def build_dwm(self, sudo_password=None):
-        """Build DWM from source"""
+    def build_dwm(self, sudo_password=None, on_line=None, on_done=None):
+        """Build DWM from source.
+
+        With on_line/on_done the build runs in the background and the
+        started BuildRunner is returned for cancel(); otherwise this blocks
+        and returns (success, output) as before.
+        """
         if not self.dwm_path:
+            if on_done:
+                on_done(False, [])
+                return None
             return False, "DWM path not found"
 
-        try:
-            original_dir = os.getcwd()
-            os.chdir(self.dwm_path)
-
-            build_commands = ["make clean", "make"]
-            if sudo_password:
-                install_cmd = "make install"
-                build_commands.append(install_cmd)
-
-            output = []
-            for cmd in build_commands:
-                if sudo_password and "install" in cmd:
-                    full_cmd = f"echo {sudo_password} | sudo -S {cmd}"
-                else:
-                    full_cmd = cmd
-
-                result = subprocess.run(
-                    full_cmd,
-                    shell=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-
-                output.append(f"Command: {cmd}")
-                output.append(f"Return code: {result.returncode}")
-                output.append(f"Output: {result.stdout}")
-
-                if result.stderr:
-                    output.append(f"Error: {result.stderr}")
-
-                if result.returncode != 0:
-                    os.chdir(original_dir)
-                    return False, "\n".join(output)
-
-            os.chdir(original_dir)
-            return True, "\n".join(output)
-
-        except Exception as e:
-            return False, f"Build error: {str(e)}"
+        fingerprint = BuildFingerprint(self.dwm_path)
+        plan, current = fingerprint.plan()
+        steps = []
+        if plan == "full":
+            steps.append(("clean", ["make", "clean"]))
+        if plan != "up to date":
+            steps.append(("compile", ["make", f"-j{build_jobs()}"]))
+        if sudo_password and steps:
+            # Only install needs root; it finds everything already built.
+            # Password goes over stdin, never through a shell command line
+            steps.append(("install", ["sudo", "-S", "-p", "", "make", "install"],
+                          sudo_password + "\n"))
+
+        def finished(success, phases):
+            if success and any(name == "install" for name, _, _ in phases):
+                fingerprint.save(current)
+            elif any(name == "compile" and returncode == 0 for name, returncode, _ in phases):
+                fingerprint.save(current, installed=False)
+            if on_done:
+                on_done(success, phases)
+
+        output = []
+        runner = BuildRunner(self.dwm_path, steps, on_line or output.append, finished)
+        runner.on_line(f"==> {plan} build\n" if steps else "==> Up to date, nothing to build\n")
+        if on_line or on_done:
+            return runner.start()
+        runner.run()
+        return runner.success, "".join(output)
 
     def create_backup(self):
         """Create a backup of the DWM configuration"""
@@ -631,77 +1952,80 @@ class DWMConfig:
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_name = f"dwm_backup_{timestamp}"
         backup_path = os.path.join(self.backup_dir, backup_name)
+        store = BackupStore(self.backup_dir)
 
         try:
-            os.makedirs(backup_path, exist_ok=True)
-
-            # Copy configuration files
-            for filename in ['config.h', 'config.def.h', 'patches.h']:
+            # Store file contents in the object store, unchanged files are
+            # already there and cost nothing
+            objects = {}
+            modes = {}
+            for filename in ['config.h', 'config.def.h', 'patches.h', 'autostart.sh']:
                 src_path = os.path.join(self.dwm_path, filename)
                 if os.path.exists(src_path):
-                    shutil.copy2(src_path, backup_path)
+                    with open(src_path, 'rb') as f:
+                        objects[filename] = store.put(f.read())
+                    modes[filename] = os.stat(src_path).st_mode & 0o7777
 
-            # Copy autostart.sh if it exists
-            autostart_path = os.path.join(self.dwm_path, 'autostart.sh')
-            if os.path.exists(autostart_path):
-                shutil.copy2(autostart_path, backup_path)
+            os.makedirs(backup_path, exist_ok=True)
 
-            # Create metadata
+            # Create metadata, which doubles as the backup manifest
             metadata = {
                 'created': timestamp,
                 'dwm_path': self.dwm_path,
-                'files': [f for f in os.listdir(backup_path)]
+                'files': list(objects),
+                'objects': objects,
+                'modes': modes
             }
 
             with open(os.path.join(backup_path, 'metadata.json'), 'w') as f:
                 json.dump(metadata, f, indent=4)
+            store.append_catalog(dict(metadata, name=backup_name))
 
             return True, f"Backup created at {backup_path}"
 
         except Exception as e:
             return False, f"Backup failed: {str(e)}"
 
-    def list_backups(self):
-        """List available backups"""
+    def gc_backups(self):
+        """Remove stored file contents no backup refers to anymore"""
+        try:
+            removed, freed = BackupStore(self.backup_dir).gc()
+        except OSError as e:
+            return False, f"Cleanup failed: {str(e)}"
+        return True, f"Removed {removed} unused file(s), freed {freed / 1024:.1f} KiB"
+
+    def list_backups(self, since=None, until=None, offset=0, limit=None):
+        """List available backups, newest first.
+
+        Reads the backup catalog only; since/until narrow the time range and
+        offset/limit page through the result.
+        """
         backups = []
 
         if not os.path.exists(self.backup_dir):
             return backups
 
-        for item in os.listdir(self.backup_dir):
-            backup_path = os.path.join(self.backup_dir, item)
-            metadata_path = os.path.join(backup_path, 'metadata.json')
-
-            if os.path.isdir(backup_path) and os.path.exists(metadata_path):
-                try:
-                    with open(metadata_path, 'r') as f:
-                        metadata = json.load(f)
-
-                    created = metadata.get('created', item.replace('dwm_backup_', ''))
-                    dwm_path = metadata.get('dwm_path', 'Unknown')
-                    files = metadata.get('files', [])
-
-                    backups.append({
-                        'name': item,
-                        'path': backup_path,
-                        'created': created,
-                        'dwm_path': dwm_path,
-                        'files': files
-                    })
-                except Exception:
-                    # If metadata is invalid, still include the backup with minimal info
-                    backups.append({
-                        'name': item,
-                        'path': backup_path,
-                        'created': item.replace('dwm_backup_', ''),
-                        'dwm_path': 'Unknown',
-                        'files': []
-                    })
-
-        # Sort by creation time (newest first)
-        backups.sort(key=lambda x: x['created'], reverse=True)
+        for entry in BackupStore(self.backup_dir).query(since, until, offset, limit):
+            backups.append({
+                'name': entry['name'],
+                'path': os.path.join(self.backup_dir, entry['name']),
+                'created': entry['created'],
+                'dwm_path': entry.get('dwm_path', 'Unknown'),
+                'files': entry.get('files', [])
+            })
         return backups
 
+    def delete_backup(self, backup_path):
+        """Delete a backup and the stored files only it referenced"""
+        name = os.path.basename(os.path.normpath(backup_path))
+        try:
+            shutil.rmtree(backup_path)
+            BackupStore(self.backup_dir).append_catalog({'deleted': name})
+        except Exception as e:
+            return False, f"Delete failed: {str(e)}"
+        self.gc_backups()
+        return True, f"Deleted backup {name}"
+
     def restore_backup(self, backup_path):
         """Restore DWM configuration from backup"""
         if not self.dwm_path:
@@ -714,11 +2038,27 @@ class DWMConfig:
             # Create a backup of current configuration first
             self.create_backup()
 
-            # Copy files from backup to DWM directory
-            for filename in ['config.h', 'config.def.h', 'patches.h', 'autostart.sh']:
-                src_path = os.path.join(backup_path, filename)
-                if os.path.exists(src_path):
-                    shutil.copy2(src_path, self.dwm_path)
+            metadata = {}
+            metadata_path = os.path.join(backup_path, 'metadata.json')
+            if os.path.exists(metadata_path):
+                with open(metadata_path, 'r') as f:
+                    metadata = json.load(f)
+
+            if 'objects' in metadata:
+                # Write files back from the object store
+                store = BackupStore(os.path.dirname(os.path.normpath(backup_path)))
+                for filename, digest in metadata['objects'].items():
+                    dst_path = os.path.join(self.dwm_path, filename)
+                    with open(dst_path, 'wb') as f:
+                        f.write(store.get(digest))
+                    if filename in metadata.get('modes', {}):
+                        os.chmod(dst_path, metadata['modes'][filename])
+            else:
+                # Backups made before the object store hold plain copies
+                for filename in ['config.h', 'config.def.h', 'patches.h', 'autostart.sh']:
+                    src_path = os.path.join(backup_path, filename)
+                    if os.path.exists(src_path):
+                        shutil.copy2(src_path, self.dwm_path)
 
             # Reload configuration
             self.config_files = self.find_config_files()
@@ -745,15 +2085,55 @@ class DWMConfig:
             'backups': self.list_backups() if category == 'Backups' else None
         }
 
+class BuildOutputWindow(Gtk.Window):
+    """Live build log with a cancel button"""
+
+    def __init__(self, parent, on_cancel):
+        super().__init__(title="Build Output", transient_for=parent)
+        self.set_default_size(700, 450)
+
+        self.textview = Gtk.TextView(monospace=True, editable=False, margin=10)
+        self.buffer = self.textview.get_buffer()
+        self.end_mark = self.buffer.create_mark("end", self.buffer.get_end_iter(), False)
+        scrolled = Gtk.ScrolledWindow()
+        scrolled.add(self.textview)
+
+        self.status = Gtk.Label(label="Building...", xalign=0)
+        self.cancel_btn = Gtk.Button(label="Cancel")
+        self.cancel_btn.connect("clicked", lambda button: on_cancel())
+        footer = Gtk.Box(spacing=6, margin=6)
+        footer.pack_start(self.status, True, True, 0)
+        footer.pack_end(self.cancel_btn, False, False, 0)
+
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        box.pack_start(scrolled, True, True, 0)
+        box.pack_start(footer, False, False, 0)
+        self.add(box)
+        self.show_all()
+
+    def append_output(self, text):
+        self.buffer.insert(self.buffer.get_end_iter(), text)
+        self.textview.scroll_mark_onscreen(self.end_mark)
+        return False
+
+    def finish(self, success, phases):
+        timings = ", ".join(f"{name} {seconds:.1f}s" for name, _, seconds in phases)
+        self.status.set_text(f"{'Build succeeded' if success else 'Build failed'}"
+                             f"{' (' + timings + ')' if timings else ''}")
+        self.cancel_btn.set_label("Close")
+        return False
+
+
 class ModernConfigurator(Gtk.Window):
     def __init__(self, config):
         super().__init__(title="DWM Studio")
         self.config = config
         self.current_search = ""
         self.set_default_size(1280, 800)
+        self.build_runner = None
         self.setup_style()
-        self.init_ui()
         self.stack = Gtk.Stack()
+        self.init_ui()
         self.connect("destroy", Gtk.main_quit)
 
 
@@ -825,83 +2205,102 @@ class ModernConfigurator(Gtk.Window):
         restore_item.connect("activate", self.on_restore_backup_dialog)
         menu.append(restore_item)
 
+        gc_item = Gtk.MenuItem(label="Clean Up Backups")
+        gc_item.connect("activate", self.on_gc_backups)
+        menu.append(gc_item)
+
         menu.show_all()
         return menu
 
+    def on_restore_backup_dialog(self, widget):
+        """Show restore backup dialog"""
+        dialog = Gtk.FileChooserDialog(
+            title="Select Backup",
+            parent=self,
+            action=Gtk.FileChooserAction.SELECT_FOLDER
+        )
+        dialog.add_buttons(
+            Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+            Gtk.STOCK_OPEN, Gtk.ResponseType.OK
+        )
 
+        response = dialog.run()
+        if response == Gtk.ResponseType.OK:
+            backup_path = dialog.get_filename()
+            success, message = self.config.restore_backup(backup_path)
+            self.show_status_message("Restore Status", message)
 
-        def on_restore_backup_dialog(self, widget):
-            """Show restore backup dialog"""
-            dialog = Gtk.FileChooserDialog(
-                title="Select Backup",
-                parent=self,
-                action=Gtk.FileChooserAction.SELECT_FOLDER
-            )
-            dialog.add_buttons(
-                Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
-                Gtk.STOCK_OPEN, Gtk.ResponseType.OK
-            )
-
-            response = dialog.run()
-            if response == Gtk.ResponseType.OK:
-                backup_path = dialog.get_filename()
-                success, message = self.config.restore_backup(backup_path)
-                self.show_status_message("Restore Status", message)
-
-            dialog.destroy()
+        dialog.destroy()
 
 
 
-        def create_rules_ui(self):
-            scrolled = Gtk.ScrolledWindow()
-            self.rules_list = Gtk.ListBox()
+    def create_rules_ui(self):
+        scrolled = Gtk.ScrolledWindow()
+        self.rules_list = Gtk.ListBox()
+        self.populate_rules()
 
-            config = self.config.get_category_config('Rules')
-            for rule in config['settings']:
-                row = Gtk.ListBoxRow()
-                box = Gtk.Box(spacing=6, margin=3)
+        add_btn = Gtk.Button(label="Add Rule", margin=6)
+        add_btn.connect("clicked", self.on_add_rule)
 
-                class_entry = Gtk.Entry(text=rule.get('class', ''), width_chars=15)
-                class_entry.set_placeholder_text("Class")
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        box.pack_start(self.rules_list, True, True, 0)
+        box.pack_start(add_btn, False, False, 0)
+        scrolled.add(box)
 
-                instance_entry = Gtk.Entry(text=rule.get('instance', ''), width_chars=15)
-                instance_entry.set_placeholder_text("Instance")
+        return scrolled
 
-                title_entry = Gtk.Entry(text=rule.get('title', ''), width_chars=15)
-                title_entry.set_placeholder_text("Title")
+    def populate_rules(self):
+        """(Re)create the rule rows from the parsed rules[]"""
+        for row in self.rules_list.get_children():
+            self.rules_list.remove(row)
+        config = self.config.get_category_config('Rules')
+        shadowed = dict(self.config.ruleset.shadowed())
+        for index, rule in enumerate(config['settings']):
+            self.add_rule_row(rule, shadowed.get(index))
+        self.rules_list.show_all()
 
-                tags_entry = Gtk.Entry(text=str(rule.get('tags', 0)), width_chars=8)
-                tags_entry.set_placeholder_text("Tags")
+    def add_rule_row(self, rule, shadowed_by=None):
+        row = Gtk.ListBoxRow()
+        row.rule = rule
+        box = Gtk.Box(spacing=6, margin=3)
 
-                floating_switch = Gtk.Switch(active=rule.get('isfloating', False))
-                floating_label = Gtk.Label(label="Float")
+        class_entry = Gtk.Entry(text=rule.get('class', ''), width_chars=15)
+        class_entry.set_placeholder_text("Class")
+        if shadowed_by is not None:
+            class_entry.set_icon_from_icon_name(Gtk.EntryIconPosition.SECONDARY, "dialog-warning-symbolic")
+            class_entry.set_icon_tooltip_text(Gtk.EntryIconPosition.SECONDARY,
+                                              f"Never has an effect: rule {shadowed_by + 1} matches "
+                                              "the same windows and overrides it")
 
-                monitor_entry = Gtk.Entry(text=str(rule.get('monitor', -1)), width_chars=5)
-                monitor_entry.set_placeholder_text("Monitor")
+        instance_entry = Gtk.Entry(text=rule.get('instance', ''), width_chars=15)
+        instance_entry.set_placeholder_text("Instance")
 
-                delete_btn = Gtk.Button.new_from_icon_name("edit-delete-symbolic", Gtk.IconSize.BUTTON)
+        title_entry = Gtk.Entry(text=rule.get('title', ''), width_chars=15)
+        title_entry.set_placeholder_text("Title")
 
-                box.pack_start(class_entry, False, False, 0)
-                box.pack_start(instance_entry, False, False, 0)
-                box.pack_start(title_entry, False, False, 0)
-                box.pack_start(tags_entry, False, False, 0)
-                box.pack_start(floating_label, False, False, 0)
-                box.pack_start(floating_switch, False, False, 0)
-                box.pack_start(monitor_entry, False, False, 0)
-                box.pack_start(delete_btn, False, False, 0)
-                row.add(box)
-                self.rules_list.add(row)
+        tags_entry = Gtk.Entry(text=str(rule.get('tags', 0)), width_chars=8)
+        tags_entry.set_placeholder_text("Tags")
 
-            add_btn = Gtk.Button(label="Add Rule", margin=6)
-            add_btn.connect("clicked", self.on_add_rule)
+        floating_switch = Gtk.Switch(active=rule.get('isfloating', False))
+        floating_label = Gtk.Label(label="Float")
 
-            box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
-            box.pack_start(self.rules_list, True, True, 0)
-            box.pack_start(add_btn, False, False, 0)
-            scrolled.add(box)
+        monitor_entry = Gtk.Entry(text=str(rule.get('monitor', -1)), width_chars=5)
+        monitor_entry.set_placeholder_text("Monitor")
 
-            return scrolled
+        delete_btn = Gtk.Button.new_from_icon_name("edit-delete-symbolic", Gtk.IconSize.BUTTON)
+        delete_btn.connect("clicked", self.on_delete_row, row)
 
+        box.pack_start(class_entry, False, False, 0)
+        box.pack_start(instance_entry, False, False, 0)
+        box.pack_start(title_entry, False, False, 0)
+        box.pack_start(tags_entry, False, False, 0)
+        box.pack_start(floating_label, False, False, 0)
+        box.pack_start(floating_switch, False, False, 0)
+        box.pack_start(monitor_entry, False, False, 0)
+        box.pack_start(delete_btn, False, False, 0)
+        row.add(box)
+        self.rules_list.add(row)
+        return row
 
     def create_appearance_ui(self):
         scrolled = Gtk.ScrolledWindow()
@@ -934,35 +2333,110 @@ class ModernConfigurator(Gtk.Window):
     def create_keybinds_ui(self):
         scrolled = Gtk.ScrolledWindow()
         self.keybind_list = Gtk.ListBox()
+        self.chord_rows = {}  # chord -> rows bound to it, for instant conflict checks
+        self.row_chords = {}
 
-        config = self.config.get_category_config('Keybinds')
-        for kb in config['settings']:
-            row = Gtk.ListBoxRow()
-            box = Gtk.Box(spacing=6, margin=3)
+        lookup = Gtk.SearchEntry(margin=6)
+        lookup.set_placeholder_text("What does a chord do? e.g. Mod+Shift+x")
+        lookup.connect("search-changed", self.on_chord_lookup)
+        self.chord_result = Gtk.Label(xalign=0, margin=6, selectable=True)
 
-            mod_entry = Gtk.Entry(text=kb['mod'], width_chars=8)
-            key_entry = Gtk.Entry(text=kb['key'], width_chars=4)
-            func_entry = Gtk.Entry(text=kb['function'])
-            arg_entry = Gtk.Entry(text=kb['argument'])
-            delete_btn = Gtk.Button.new_from_icon_name("edit-delete-symbolic", Gtk.IconSize.BUTTON)
-
-            box.pack_start(mod_entry, False, False, 0)
-            box.pack_start(key_entry, False, False, 0)
-            box.pack_start(func_entry, False, False, 0)
-            box.pack_start(arg_entry, True, True, 0)
-            box.pack_start(delete_btn, False, False, 0)
-            row.add(box)
-            self.keybind_list.add(row)
+        self.populate_keybinds()
 
         add_btn = Gtk.Button(label="Add Keybind", margin=6)
         add_btn.connect("clicked", self.on_add_keybind)
 
         box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        box.pack_start(lookup, False, False, 0)
+        box.pack_start(self.chord_result, False, False, 0)
         box.pack_start(self.keybind_list, True, True, 0)
         box.pack_start(add_btn, False, False, 0)
         scrolled.add(box)
         return scrolled
 
+    def populate_keybinds(self):
+        """(Re)create the keybind rows from the parsed keys[]"""
+        for row in self.keybind_list.get_children():
+            self.keybind_list.remove(row)
+        self.chord_rows.clear()
+        self.row_chords.clear()
+        config = self.config.get_category_config('Keybinds')
+        for kb in config['settings']:
+            self.add_keybind_row(kb)
+        self.keybind_list.show_all()
+
+    def add_keybind_row(self, kb):
+        """Add a row for kb to the keybind list and index its chord"""
+        row = Gtk.ListBoxRow()
+        row.binding = kb
+        box = Gtk.Box(spacing=6, margin=3)
+
+        mod_entry = Gtk.Entry(text=kb['mod'], width_chars=8)
+        key_entry = Gtk.Entry(text=kb['key'], width_chars=4)
+        func_entry = Gtk.Entry(text=kb['function'])
+        arg_entry = Gtk.Entry(text=kb['argument'])
+        delete_btn = Gtk.Button.new_from_icon_name("edit-delete-symbolic", Gtk.IconSize.BUTTON)
+        delete_btn.connect("clicked", self.on_delete_keybind, row)
+        mod_entry.connect("changed", self.on_keybind_edited, row)
+        key_entry.connect("changed", self.on_keybind_edited, row)
+
+        box.pack_start(mod_entry, False, False, 0)
+        box.pack_start(key_entry, False, False, 0)
+        box.pack_start(func_entry, False, False, 0)
+        box.pack_start(arg_entry, True, True, 0)
+        box.pack_start(delete_btn, False, False, 0)
+        row.add(box)
+        self.keybind_list.add(row)
+        self.on_keybind_edited(None, row)
+        return row
+
+    def on_keybind_edited(self, entry, row):
+        """Move the row to its new chord and flag every row sharing a chord"""
+        mod_entry, key_entry = row.get_child().get_children()[:2]
+        chord = self.config.keymap.chord(mod_entry.get_text(), key_entry.get_text())
+        old = self.row_chords.get(row)
+        if old == chord:
+            return
+        if old is not None:
+            self.chord_rows[old].discard(row)
+        self.row_chords[row] = chord
+        self.chord_rows.setdefault(chord, set()).add(row)
+        for affected in (old, chord):
+            for other in self.chord_rows.get(affected, ()):
+                self.mark_keybind_conflict(other)
+
+    def mark_keybind_conflict(self, row):
+        key_entry = row.get_child().get_children()[1]
+        others = [other for other in self.chord_rows[self.row_chords[row]] if other is not row]
+        if others:
+            bound = ", ".join(other.get_child().get_children()[2].get_text() for other in others)
+            key_entry.set_icon_from_icon_name(Gtk.EntryIconPosition.SECONDARY, "dialog-warning-symbolic")
+            key_entry.set_icon_tooltip_text(Gtk.EntryIconPosition.SECONDARY, f"Also bound to: {bound}")
+        else:
+            key_entry.set_icon_from_icon_name(Gtk.EntryIconPosition.SECONDARY, None)
+
+    def on_delete_keybind(self, button, row):
+        chord = self.row_chords.pop(row, None)
+        if chord is not None:
+            self.chord_rows[chord].discard(row)
+            for other in self.chord_rows[chord]:
+                self.mark_keybind_conflict(other)
+        self.on_delete_row(button, row)
+
+    def on_chord_lookup(self, entry):
+        """Show what a chord such as Mod+Shift+x is bound to"""
+        text = entry.get_text().strip()
+        if not text:
+            self.chord_result.set_text("")
+            return
+        found = self.config.keymap.lookup(text)
+        if not found:
+            self.chord_result.set_text(f"{text} is not bound")
+            return
+        self.chord_result.set_text("\n".join(
+            self.config.get_keybind_description(b['function'], display_argument(b['argument']))
+            for b in found))
+
     def create_patches_ui(self):
         scrolled = Gtk.ScrolledWindow()
         self.patch_list = Gtk.ListBox()
@@ -1017,8 +2491,17 @@ class ModernConfigurator(Gtk.Window):
         self.stack.set_visible_child_name(categories[row.get_index()])
 
     def on_setting_changed(self, widget, *args):
-        # Handle configuration updates
-        pass
+        # Record the new value; save_config writes only what changed
+        setting = args[-1]
+        if isinstance(widget, Gtk.Switch):
+            value = '1' if widget.get_active() else '0'
+        elif isinstance(widget, Gtk.Scale):
+            value = f'{widget.get_value():.2f}'
+        else:
+            value = widget.get_text()
+        setting['value'] = value
+        if setting['key'] in self.config.config:
+            self.config.config[setting['key']]['value'] = value
 
     def on_patch_toggled(self, switch, gparam, patch_name):
         # Handle patch updates
@@ -1028,11 +2511,52 @@ class ModernConfigurator(Gtk.Window):
         success, message = self.config.create_backup()
         self.show_status_message("Backup Created" if success else "Backup Failed", message)
 
+    def on_gc_backups(self, widget):
+        success, message = self.config.gc_backups()
+        self.show_status_message("Backup Cleanup" if success else "Backup Cleanup Failed", message)
+
 
     def on_build_clicked(self, button):
+        if not self.config.dwm_path:
+            self.show_status_message("Build Failed", "DWM path not found")
+            return
+        if self.build_runner and self.build_runner.success is None:
+            self.show_status_message("Build", "A build is already running")
+            return
+
+        dialog = Gtk.Dialog(title="Build DWM", transient_for=self, flags=0)
+        dialog.add_buttons(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+                           "Build", Gtk.ResponseType.OK)
+        dialog.set_default_response(Gtk.ResponseType.OK)
+        password_entry = Gtk.Entry(visibility=False, activates_default=True)
+        box = dialog.get_content_area()
+        box.pack_start(Gtk.Label(label="Sudo password (leave empty to only compile):"), False, False, 0)
+        box.pack_start(password_entry, False, False, 0)
+        dialog.show_all()
+        response = dialog.run()
+        password = password_entry.get_text()
+        dialog.destroy()
+        if response != Gtk.ResponseType.OK:
+            return
 
-        # Handle build process
-            pass
+        def on_cancel():
+            if self.build_runner.success is None:
+                self.build_runner.cancel()
+            else:
+                output.destroy()
+
+        def on_done(success, phases):
+            GLib.idle_add(output.finish, success, phases)
+            GLib.idle_add(self.build_btn.set_sensitive, True)
+
+        output = BuildOutputWindow(self, on_cancel)
+        self.build_btn.set_sensitive(False)
+        self.build_runner = self.config.build_dwm(
+            password or None,
+            on_line=lambda line: GLib.idle_add(output.append_output, line),
+            on_done=on_done
+        )
+        password = None
 
     def on_save_clicked(self, button):
         """Save all changes to config"""
@@ -1055,10 +2579,15 @@ class ModernConfigurator(Gtk.Window):
                         'key': key,
                         'function': func,
                         'argument': arg,
-                        'description': self.config.get_keybind_description(func, arg)
+                        'macro': getattr(row, 'binding', {}).get('macro'),
+                        'span': getattr(row, 'binding', {}).get('span'),
+                        'description': self.config.get_keybind_description(func, display_argument(arg))
                     })
 
             success, message = self.config.update_keybinds(keybinds)
+            if success:
+                # Rows point at array elements by offset; take the new ones
+                self.populate_keybinds()
             self.show_status_message("Save Status", message)
 
         elif current_page == "rules":
@@ -1081,10 +2610,15 @@ class ModernConfigurator(Gtk.Window):
                         'title': title,
                         'tags': tags,
                         'isfloating': floating,
-                        'monitor': monitor
+                        'monitor': monitor,
+                        'fields': getattr(row, 'rule', {}).get('fields'),
+                        'macro': getattr(row, 'rule', {}).get('macro'),
+                        'span': getattr(row, 'rule', {}).get('span')
                     })
 
             success, message = self.config.update_rules(rules)
+            if success:
+                self.populate_rules()
             self.show_status_message("Save Status", message)
 
         elif current_page == "appearance":
@@ -1098,68 +2632,24 @@ class ModernConfigurator(Gtk.Window):
 
     def on_add_keybind(self, button):
         """Add a new keybinding row"""
-        row = Gtk.ListBoxRow()
-        box = Gtk.Box(spacing=6, margin=3)
-
-        mod_entry = Gtk.Entry(text="MODKEY", width_chars=8)
-        key_entry = Gtk.Entry(text="XK_space", width_chars=4)
-        func_entry = Gtk.Entry(text="spawn")
-        arg_entry = Gtk.Entry(text="dmenu_run")
-        delete_btn = Gtk.Button.new_from_icon_name("edit-delete-symbolic", Gtk.IconSize.BUTTON)
-        delete_btn.connect("clicked", self.on_delete_row, row)
-
-        box.pack_start(mod_entry, False, False, 0)
-        box.pack_start(key_entry, False, False, 0)
-        box.pack_start(func_entry, False, False, 0)
-        box.pack_start(arg_entry, True, True, 0)
-        box.pack_start(delete_btn, False, False, 0)
-        row.add(box)
-        self.keybind_list.add(row)
+        self.add_keybind_row({
+            'mod': "MODKEY",
+            'key': "XK_space",
+            'function': "spawn",
+            'argument': "dmenu_run"
+        })
         self.keybind_list.show_all()
 
-
     def on_add_rule(self, button):
         """Add a new window rule row"""
-        row = Gtk.ListBoxRow()
-        box = Gtk.Box(spacing=6, margin=3)
-
-        class_entry = Gtk.Entry(width_chars=15)
-        class_entry.set_placeholder_text("Class")
-
-        instance_entry = Gtk.Entry(width_chars=15)
-        instance_entry.set_placeholder_text("Instance")
-
-        title_entry = Gtk.Entry(width_chars=15)
-        title_entry.set_placeholder_text("Title")
-
-        tags_entry = Gtk.Entry(text="0", width_chars=8)
-        tags_entry.set_placeholder_text("Tags")
-
-        floating_switch = Gtk.Switch()
-        floating_label = Gtk.Label(label="Float")
-
-        monitor_entry = Gtk.Entry(text="-1", width_chars=5)
-        monitor_entry.set_placeholder_text("Monitor")
-
-        delete_btn = Gtk.Button.new_from_icon_name("edit-delete-symbolic", Gtk.IconSize.BUTTON)
-        delete_btn.connect("clicked", self.on_delete_row, row)
-
-        box.pack_start(class_entry, False, False, 0)
-        box.pack_start(instance_entry, False, False, 0)
-        box.pack_start(title_entry, False, False, 0)
-        box.pack_start(tags_entry, False, False, 0)
-        box.pack_start(floating_label, False, False, 0)
-        box.pack_start(floating_switch, False, False, 0)
-        box.pack_start(monitor_entry, False, False, 0)
-        box.pack_start(delete_btn, False, False, 0)
-        row.add(box)
-        self.rules_list.add(row)
+        self.add_rule_row({'class': '', 'instance': '', 'title': '', 'tags': '0',
+                           'isfloating': False, 'monitor': '-1'})
         self.rules_list.show_all()
 
     def on_delete_row(self, button, row):
-     """Remove a row from a ListBox"""
-    container = row.get_parent()
-    container.remove(row)
+        """Remove a row from a ListBox"""
+        container = row.get_parent()
+        container.remove(row)
 
     def setup_style(self):
         css = b"""
@@ -1204,6 +2694,14 @@ class ModernConfigurator(Gtk.Window):
         dialog.destroy()
 
 def main():
+    if '--simulate-rules' in sys.argv:
+        # --simulate-rules [FILE]: FILE holds class<TAB>instance<TAB>title<TAB>role
+        # lines, '-' reads them from stdin; without FILE the live X clients are used
+        args = sys.argv[sys.argv.index('--simulate-rules') + 1:]
+        windows = read_windows(args[0]) if args else live_windows()
+        simulate_rules(DWMConfig(), windows)
+        return
+
     config = DWMConfig()
     win = ModernConfigurator(config)
     win.show_all()
@@ -0,0 +1,3190 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import math
+import time
+import signal
+import zlib
+import bisect
+import hashlib
+import threading
+from collections import deque
+
+# GTK is imported by require_gtk() when the GUI starts, so the command line
+# works without a display and starts quickly. concurrent.futures (and the
+# logging module it pulls in), subprocess, shutil, tempfile and datetime are
+# likewise imported by the functions that use them; `list` needs none of them.
+Gtk = Gdk = GLib = None
+
+
+def require_gtk():
+    global Gtk, Gdk, GLib
+    if Gtk is None:
+        import gi
+        gi.require_version('Gtk', '3.0')
+        from gi.repository import Gtk, Gdk, GLib
+
+# Precompiled once; the header tokenizer runs a single scan over the text of
+# patches.def.h / patches.h for each detected project. The comment branch is
+# the unrolled form of /\*.*?\*/, which sre scans much faster than a lazy dot.
+HEADER_TOKEN_RE = re.compile(
+    r'/\*([^*]*(?:\*+[^*/][^*]*)*)\*+/'
+    r'|#[ \t]*define[ \t]+(\w+)_PATCH\b[ \t]*([^\s/]*)'
+)
+COMMENT_LEAD_RE = re.compile(r'^[ \t]*\**[ \t]?', re.M)
+# Matched against the raw bytes of patches.h so offsets are byte offsets
+PATCH_VALUE_RE = re.compile(rb'^[ \t]*#[ \t]*define[ \t]+(\w+)_PATCH[ \t]+(\d+)', re.M)
+URL_RE = re.compile(r'https?://[^\s*]+')
+WORD_RE = re.compile(r'[a-z0-9]+')
+REGEX_CHARS = frozenset('\\^$.|?*+()[]{}')
+
+# config.mk lines that only matter when the given patch is enabled
+CONFIG_MK_PATTERNS = {
+    'XINERAMA': (r'XINERAMA(LIBS|FLAGS)', '#XINERAMA'),
+    'ROUNDED_CORNERS_PATCH': (r'XEXTLIB = -lXext', '#XEXTLIB'),
+    'SWALLOW_PATCH': (r'XCBLIBS = -lX11-xcb -lxcb -lxcb-res', '#XCBLIBS'),
+    'BAR_WINICON_PATCH': (r'IMLIB2LIBS = -lImlib2', '#IMLIB2LIBS'),
+    'BAR_ALPHA_PATCH': (r'XRENDER = -lXrender', '#XRENDER'),
+    'BAR_PANGO_PATCH': (r'PANGOINC|PANGOLIB', '#PANGO'),
+    'IPC_PATCH': (r'YAJL(LIBS|INC)', '#YAJL')
+}
+CONFIG_MK_RES = [
+    (patch, re.compile(pattern)) for patch, (pattern, _) in CONFIG_MK_PATTERNS.items()
+]
+
+
+def format_name(name):
+    return ' '.join([
+        word.capitalize()
+        for word in name.replace('_PATCH', '').split('_') if word
+    ])
+
+
+def tokenize_header(text):
+    """Single pass over the text of a flexipatch header.
+
+    Yields ('comment', start, end, lines, urls) for every /* */ block,
+    ('define', lineno, flag, value) for every `#define X_PATCH value`, where
+    value is the literal token after the flag (may be '' or an expression
+    head), and ('code', lineno) when anything else sits between two of
+    those. Line numbers are 1-based.
+    """
+    lineno = 1
+    pos = 0
+    for match in HEADER_TOKEN_RE.finditer(text):
+        start = match.start()
+        if start != pos:
+            if not text[pos:start].isspace():
+                yield ('code', lineno)
+            lineno += text.count('\n', pos, start)
+        body, flag = match.group(1, 2)
+        if flag is not None:
+            yield ('define', lineno, flag, match.group(3))
+        else:
+            end = lineno + body.count('\n')
+            lines = COMMENT_LEAD_RE.sub('', body).strip().split('\n')
+            urls = URL_RE.findall(body) if 'http' in body else []
+            yield ('comment', lineno, end, lines, urls)
+            lineno = end
+        pos = match.end()
+
+
+def index_patch_values(data):
+    """Map flag -> (value, line offset, value start, value end) in patches.h bytes"""
+    return {
+        match.group(1).decode(): (int(match.group(2)), match.start(), *match.span(2))
+        for match in PATCH_VALUE_RE.finditer(data)
+    }
+
+
+def read_patch_values(patch_file):
+    """Return {flag: int} for every numeric `#define X_PATCH n` in patches.h"""
+    with open(patch_file, 'rb') as f:
+        data = f.read()
+    return {flag.decode(): int(value) for flag, value in PATCH_VALUE_RE.findall(data)}
+
+
+# Read once while still single-threaded: os.umask() can only be queried by
+# setting it, which would race with threads creating files
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+# atomic_write, BackupStore, build_jobs, make_targets, compiler_version and
+# BuildFingerprint have twins in dwm-flexipatch/configer.py. Both scripts stay
+# single-file so either runs on its own; a fix to one copy belongs in both.
+def atomic_write(path, data):
+    """Replace path with data (bytes) via a temp file in the same directory.
+
+    An existing file keeps its mode; a new one gets 0666 minus the umask.
+    """
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            # mkstemp creates 0600; give new files what open() would
+            mode = 0o666 & ~UMASK
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def splice_patch_values(data, patches):
+    """Return (new patches.h bytes, changed flags); the bytes are None when nothing changed.
+
+    Uses the offsets recorded at parse time; each one is re-checked with an
+    anchored match so a file edited behind our back falls back to a fresh
+    index instead of corrupting it. Everything else in the file, comments
+    and layout included, is left byte-for-byte as it was. Flags missing from
+    patches.h are appended.
+    """
+    index = None
+    edits = []
+    missing = []
+    for patch in patches:
+        flag = patch['raw_name']
+        value = b'%d' % patch['value']
+        span = None
+        offset = patch.get('offset')
+        if offset:
+            match = PATCH_VALUE_RE.match(data, offset[0])
+            if match and match.group(1) == flag.encode():
+                span = match.span(2)
+        if span is None:
+            if index is None:
+                index = index_patch_values(data)
+            if flag in index:
+                span = index[flag][2:]
+        if span is None:
+            missing.append((flag, b'#define %s_PATCH %s\n' % (flag.encode(), value)))
+        elif data[span[0]:span[1]] != value:
+            edits.append((span, value, flag))
+
+    if not edits and not missing:
+        return None, []
+
+    edits.sort()
+    chunks = []
+    pos = 0
+    for (start, end), value, _ in edits:
+        chunks.append(data[pos:start])
+        chunks.append(value)
+        pos = end
+    chunks.append(data[pos:])
+    if missing:
+        if data and not data.endswith(b'\n'):
+            chunks.append(b'\n')
+        chunks.extend(line for _, line in missing)
+    return b''.join(chunks), [flag for _, _, flag in edits] + [flag for flag, _ in missing]
+
+
+def update_patch_offsets(data, patches):
+    index = index_patch_values(data)
+    for patch in patches:
+        if patch['raw_name'] in index:
+            patch['offset'] = index[patch['raw_name']][1:]
+
+
+def write_patch_values(patch_file, patches):
+    """Splice changed values into patches.h and return the changed flags.
+
+    Nothing is written when nothing changed.
+    """
+    with open(patch_file, 'rb') as f:
+        data = f.read()
+    new_data, changed = splice_patch_values(data, patches)
+    if new_data is not None:
+        atomic_write(patch_file, new_data)
+        update_patch_offsets(new_data, patches)
+    return changed
+
+
+def commit_files(files):
+    """Replace every path in {path: bytes} or none of them.
+
+    Each new file is written and fsynced to a temp file next to its target
+    before anything is renamed. If a rename fails, the files already
+    replaced are put back from the contents read up front.
+    """
+    import tempfile
+    originals = {}
+    staged = []
+    replaced = []
+    try:
+        for path, data in files.items():
+            with open(path, 'rb') as f:
+                originals[path] = f.read()
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                       prefix='.' + os.path.basename(path), suffix='.tmp')
+            staged.append((tmp, path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+        for tmp, path in staged:
+            os.replace(tmp, path)
+            replaced.append(path)
+    except BaseException:
+        for path in replaced:
+            atomic_write(path, originals[path])
+        for tmp, _ in staged:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        raise
+
+
+def parse_config_mk(config_file):
+    """Index the config.mk lines that belong to patches in CONFIG_MK_PATTERNS"""
+    config = {'raw': []}
+    with open(config_file, 'r') as f:
+        for line in f:
+            config['raw'].append(line)
+            for patch, pattern in CONFIG_MK_RES:
+                if pattern.search(line):
+                    config.setdefault(patch, []).append({
+                        'line': len(config['raw'])-1,
+                        'original': line.strip(),
+                        'commented': line.strip().startswith('#')
+                    })
+    return config
+
+
+def parse_patch_table(def_file, patch_file):
+    """Build the patch table for one project.
+
+    Each entry carries the flag, its current value from patches.h (falling
+    back to the default in patches.def.h) with the byte offsets of that
+    #define in patches.h, the description lines with their line span in
+    patches.def.h and the URLs found in the description.
+    Flags whose default is not a literal number (`N/A`, or derived ones such
+    as BAR_WINTITLEACTIONS_PATCH) are not user toggles and are left out.
+    """
+    values = {}
+    if os.path.exists(patch_file):
+        with open(patch_file, 'rb') as f:
+            values = index_patch_values(f.read())
+    with open(def_file, 'r') as f:
+        text = f.read()
+
+    patches = []
+    comment = None
+    last_define = 0
+    for token in tokenize_header(text):
+        kind = token[0]
+        if kind == 'comment':
+            comment = token
+            last_define = 0
+        elif kind == 'define':
+            _, lineno, flag, default = token
+            # A comment describes the run of #defines directly below it
+            if comment and last_define and lineno > last_define + 1:
+                comment = None
+            last_define = lineno
+            if not default.isdigit():
+                continue
+            patch = {
+                'raw_name': flag,
+                'name': format_name(flag),
+                'value': int(default),
+                'line': lineno
+            }
+            if flag in values:
+                patch['value'] = values[flag][0]
+                patch['offset'] = values[flag][1:]
+            if comment:
+                patch['description'] = comment[3]
+                patch['urls'] = comment[4]
+                patch['span'] = (comment[1], comment[2])
+            patches.append(patch)
+        else:
+            comment = None
+            last_define = 0
+    return patches
+
+
+class ParseCache:
+    """Parsed patch tables and config.mk indexes, kept under $XDG_CACHE_HOME.
+
+    One JSON entry per project, keyed by the project path and validated
+    against (mtime_ns, size, sha256) of patches.def.h, patches.h and
+    config.mk. A changed mtime with unchanged content still counts as a hit.
+    """
+    VERSION = 2
+    FILES = ('patches.def.h', 'patches.h', 'config.mk')
+
+    def __init__(self, cache_dir=None):
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        self.cache_dir = cache_dir or os.path.join(base, 'suckless-patcher', 'projects')
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def entry_path(self, project_path):
+        key = hashlib.sha1(os.path.abspath(project_path).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    @staticmethod
+    def fingerprint(path, known=None):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if known and known[0] == st.st_mtime_ns and known[1] == st.st_size:
+            return known
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                digest.update(chunk)
+        return [st.st_mtime_ns, st.st_size, digest.hexdigest()]
+
+    def keys(self, project_path, known=None):
+        known = known or {}
+        return {
+            name: self.fingerprint(os.path.join(project_path, name), known.get(name))
+            for name in self.FILES
+        }
+
+    def lookup(self, project_path):
+        """Return (keys, entry); entry is None when the project must be parsed"""
+        entry = None
+        try:
+            with open(self.entry_path(project_path), 'r') as f:
+                entry = json.load(f)
+            if entry.get('version') != self.VERSION:
+                entry = None
+        except (OSError, ValueError):
+            pass
+
+        known = entry['files'] if entry else {}
+        keys = self.keys(project_path, known)
+        if entry and all(
+            (keys[name] or [None] * 3)[1:] == (known.get(name) or [None] * 3)[1:]
+            for name in self.FILES
+        ):
+            with self.lock:
+                self.hits += 1
+            if keys != known:
+                # Touched but unchanged; refresh the stat part of the key
+                self.store(project_path, keys, entry['patches'], entry['config'])
+            return keys, entry
+        with self.lock:
+            self.misses += 1
+        return keys, None
+
+    def store(self, project_path, keys, patches, config):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = {
+            'version': self.VERSION,
+            'path': os.path.abspath(project_path),
+            'files': keys,
+            'patches': patches,
+            'config': config
+        }
+        try:
+            atomic_write(self.entry_path(project_path), json.dumps(entry).encode())
+        except OSError:
+            pass
+
+    def invalidate(self, project_path=None):
+        """Drop the entry for one project, or every entry; returns the count"""
+        if project_path:
+            paths = [self.entry_path(project_path)]
+        elif os.path.isdir(self.cache_dir):
+            paths = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir)]
+        else:
+            paths = []
+        removed = 0
+        for path in paths:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def report(self):
+        return f"parse cache: {self.hits} hit(s), {self.misses} miss(es)"
+
+
+# Preprocessor lines and conditions in patches.def.h, patch/include.[ch]
+CPP_DIRECTIVE_RE = re.compile(r'^[ \t]*#[ \t]*(if|ifdef|ifndef|elif|else|endif)\b[ \t]*(.*?)[ \t]*(?:/[*/].*)?$', re.M)
+CPP_TOKEN_RE = re.compile(r'\s*(?:(defined)\s*\(?\s*(\w+)\s*\)?|(\w+)|(&&|\|\||==|!=|<=|>=|[!<>()]))')
+DERIVED_DEFINE_RE = re.compile(r'^[ \t]*#[ \t]*define[ \t]+(\w+)_PATCH[ \t]+([^\n]*?)[ \t]*$', re.M)
+PRECEDENCE_RE = re.compile(r'(.*?)\btakes? precedence over (.+)', re.I)
+DEPENDS_RE = re.compile(r'\b(?:depends on|requires)(?: both)?(?: code from)? (.+)', re.I)
+INCOMPATIBLE_RE = re.compile(r'\bincompatible with (?:and takes precedence over )?(.+)', re.I)
+CONFIG_MK_VAR_RE = re.compile(r'^#?\s*(\w+)\s*=')
+
+
+def cpp_condition(expr):
+    """Translate a #if expression into (python_source, macro_names).
+
+    Macros are looked up as v('NAME'); anything that is not a macro,
+    an integer or one of && || ! == != < > <= >= ( ) makes this return
+    (None, names) so callers can ignore the expression.
+    """
+    out, names = [], []
+    pos = 0
+    expr = expr.strip()
+    while pos < len(expr):
+        m = CPP_TOKEN_RE.match(expr, pos)
+        if not m or m.end() == pos:
+            return None, names
+        pos = m.end()
+        defined, defined_name, word, op = m.groups()
+        if defined:
+            names.append(defined_name)
+            out.append(f"d({defined_name!r})")
+        elif word:
+            if word.isdigit():
+                out.append(word)
+            elif word[0].isdigit():
+                return None, names
+            else:
+                names.append(word)
+                out.append(f"v({word!r})")
+        else:
+            out.append({'&&': ' and ', '||': ' or ', '!': ' not '}.get(op, op))
+    return ''.join(out) or None, names
+
+
+def cpp_literals(expr):
+    """Split a pure conjunction like `A && !B` into ([A], [B]), else None"""
+    positive, negative = [], []
+    for term in expr.split('&&'):
+        term = term.strip().strip('()').strip()
+        negated = term.startswith('!')
+        name = term.lstrip('!').strip()
+        if not re.fullmatch(r'\w+_PATCH', name):
+            return None
+        (negative if negated else positive).append(name[:-len('_PATCH')])
+    return positive, negative
+
+
+class PatchGraph:
+    """Relations between the patch flags of one project.
+
+    Gathered from three places: the prose in patches.def.h ("depends on",
+    "takes precedence over", "incompatible with"), the #if/#elif gates in
+    patch/include.h and patch/include.c (`A && B` means A needs B,
+    `A && !B` and #if A/#elif B mean one wins over the other), and derived
+    defines such as BAR_WINTITLEACTIONS_PATCH that switch on by themselves.
+    config.mk comments naming a flag tie it to the variables below them.
+
+    All relations are stored as adjacency lists keyed by flag so checking a
+    toggle only looks at that flag's neighbours. The graph is cached as JSON
+    next to the parse cache, keyed on the files it was built from.
+    """
+    VERSION = 1
+    FILES = ('patches.def.h', 'patches.h', 'config.mk', 'patch/include.h', 'patch/include.c')
+    RELATIONS = ('requires', 'required_by', 'overrides', 'overridden_by', 'conflicts')
+
+    def __init__(self, data):
+        self.data = data
+        for relation in self.RELATIONS + ('derived_by', 'config_mk'):
+            data.setdefault(relation, {})
+        data.setdefault('derived', {})
+        self.compiled = {}
+
+    @classmethod
+    def build(cls, project_path, patches):
+        flags = {p['raw_name'] for p in patches}
+        graph = cls({})
+
+        aliases = {}
+        for flag in sorted(flags):
+            key = flag.lower().replace('_', '')
+            aliases.setdefault(key, flag)
+            if flag.startswith('BAR_'):
+                aliases.setdefault(key[3:], flag)
+
+        def resolve(phrase, this):
+            """Flags named in phrase; "this patch" is the describing flag"""
+            found = [name[:-len('_PATCH')] for name in re.findall(r'\b\w+_PATCH\b', phrase)]
+            phrase = re.sub(r'\b\w+_PATCH\b', ' ', phrase)
+            for piece in re.split(r',|\band\b|\bor\b|\bwhich\b', phrase):
+                words = [w for w in re.findall(r'[a-z0-9_-]+', piece.lower())
+                         if w not in ('patch', 'patches', 'the', 'being', 'enabled')]
+                if words in (['this'], ['it']):
+                    found.append(this)
+                    continue
+                for i in range(len(words)):
+                    flag = aliases.get(''.join(words[i:]).replace('_', '').replace('-', ''))
+                    if flag:
+                        found.append(flag)
+                        break
+            return [f for f in found if f in flags]
+
+        for patch in patches:
+            flag = patch['raw_name']
+            text = ' '.join(patch.get('description', []))
+            for sentence in re.split(r'(?<=[.;:])\s+', text):
+                m = INCOMPATIBLE_RE.search(sentence)
+                if m:
+                    target, _, rest = m.group(1).partition('which takes precedence')
+                    for other in resolve(target, flag):
+                        graph.relate('conflicts', flag, other)
+                        if rest or 'which takes precedence' in m.group(1):
+                            graph.relate('overrides', other, flag)
+                        elif 'takes precedence over' in m.group(0):
+                            graph.relate('overrides', flag, other)
+                    continue
+                m = PRECEDENCE_RE.search(sentence)
+                if m:
+                    winners = resolve(m.group(1), flag) or [flag]
+                    for winner in winners:
+                        for loser in resolve(m.group(2), flag):
+                            graph.relate('overrides', winner, loser)
+                m = DEPENDS_RE.search(sentence)
+                if m:
+                    for other in resolve(m.group(1), flag):
+                        graph.relate('requires', flag, other)
+
+        for name in ('patch/include.h', 'patch/include.c'):
+            try:
+                with open(os.path.join(project_path, name), 'r') as f:
+                    graph.scan_gates(f.read(), flags)
+            except OSError:
+                pass
+
+        for name in ('patches.h', 'patches.def.h'):
+            try:
+                with open(os.path.join(project_path, name), 'r') as f:
+                    text = f.read()
+            except OSError:
+                continue
+            for flag, expr in DERIVED_DEFINE_RE.findall(text):
+                if flag in flags or expr.isdigit() or expr == 'N/A':
+                    continue
+                source, names = cpp_condition(expr)
+                if source and flag not in graph.data['derived']:
+                    graph.data['derived'][flag] = expr
+                    for name in names:
+                        if name.endswith('_PATCH'):
+                            graph.relate('derived_by', name[:-len('_PATCH')], flag, inverse=False)
+
+        try:
+            with open(os.path.join(project_path, 'config.mk'), 'r') as f:
+                graph.scan_config_mk(f.read().splitlines(), flags)
+        except OSError:
+            pass
+        return graph
+
+    def relate(self, relation, a, b, inverse=True):
+        if a == b:
+            return
+        targets = self.data[relation].setdefault(a, [])
+        if b not in targets:
+            targets.append(b)
+        if inverse:
+            back = {'requires': 'required_by', 'overrides': 'overridden_by',
+                    'conflicts': 'conflicts'}[relation]
+            targets = self.data[back].setdefault(b, [])
+            if a not in targets:
+                targets.append(a)
+
+    def scan_gates(self, text, flags):
+        chains = []  # one list of branch conditions per open #if
+        for directive, expr in CPP_DIRECTIVE_RE.findall(text):
+            if directive in ('if', 'ifdef', 'ifndef'):
+                chains.append([expr] if directive == 'if' else [])
+            elif not chains:
+                continue
+            elif directive == 'elif':
+                chains[-1].append(expr)
+            elif directive == 'endif':
+                chains.pop()
+                continue
+            else:
+                continue
+            if not chains[-1]:
+                continue
+            literals = cpp_literals(chains[-1][-1])
+            if not literals:
+                continue
+            positive, negative = literals
+            positive = [f for f in positive if f in flags]
+            for other in positive[1:]:
+                self.relate('requires', positive[0], other)
+            for loser in positive:
+                for winner in negative:
+                    if winner in flags:
+                        self.relate('overrides', winner, loser)
+            # An earlier #if/#elif branch wins over the later ones
+            for earlier in chains[-1][:-1]:
+                earlier = cpp_literals(earlier)
+                if earlier and earlier[0] and earlier[0][0] in flags and positive:
+                    self.relate('overrides', earlier[0][0], positive[0])
+
+    def scan_config_mk(self, lines, flags):
+        owners = []
+        for line in lines:
+            stripped = line.strip()
+            if not stripped:
+                owners = []
+            elif CONFIG_MK_VAR_RE.match(stripped):
+                for flag in owners:
+                    targets = self.data['config_mk'].setdefault(flag, [])
+                    targets.append(CONFIG_MK_VAR_RE.match(stripped).group(1))
+            elif stripped.startswith('#'):
+                owners = [name[:-len('_PATCH')] for name in re.findall(r'\b\w+_PATCH\b', stripped)
+                          if name[:-len('_PATCH')] in flags]
+
+    def evaluate(self, flag, value_of):
+        """Value of a derived flag for the current values"""
+        if flag not in self.compiled:
+            source, _ = cpp_condition(self.data['derived'][flag])
+            self.compiled[flag] = compile(source, flag, 'eval')
+        v = lambda name: value_of(name[:-len('_PATCH')]) if name.endswith('_PATCH') else 0
+        return bool(eval(self.compiled[flag], {'__builtins__': {}}, {'v': v, 'd': lambda name: 0}))
+
+    def get(self, relation, flag):
+        return self.data[relation].get(flag, [])
+
+    def check(self, flag, value_of):
+        """Problems and side effects of flag's current value.
+
+        Returns (level, message) pairs, level being 'error', 'warning' or
+        'info'; value_of(flag) returns the current value of any flag.
+        """
+        name = format_name
+        issues = []
+        if value_of(flag):
+            for other in self.get('requires', flag):
+                if not value_of(other):
+                    issues.append(('error', f"{name(flag)} needs {name(other)}, which is off"))
+            for other in self.get('conflicts', flag):
+                if value_of(other):
+                    issues.append(('error', f"{name(flag)} is incompatible with {name(other)}"))
+            for other in self.get('overridden_by', flag):
+                if value_of(other):
+                    issues.append(('warning', f"{name(other)} takes precedence over {name(flag)}"))
+            for other in self.get('overrides', flag):
+                if value_of(other):
+                    issues.append(('info', f"{name(flag)} takes precedence over {name(other)}"))
+            variables = self.get('config_mk', flag)
+            if variables:
+                issues.append(('info', f"Uses config.mk: {', '.join(variables)}"))
+        else:
+            for other in self.get('required_by', flag):
+                if value_of(other):
+                    issues.append(('error', f"{name(other)} needs {name(flag)}"))
+        for derived in self.get('derived_by', flag):
+            state = 'on' if self.evaluate(derived, value_of) else 'off'
+            issues.append(('info', f"{name(derived)} is now {state}"))
+        return issues
+
+    def describe(self, flag):
+        """One line per relation of flag, for the details pane"""
+        labels = (('requires', "Requires"), ('required_by', "Required by"),
+                  ('overrides', "Takes precedence over"), ('overridden_by', "Overridden by"),
+                  ('conflicts', "Incompatible with"), ('derived_by', "Pulls in"))
+        lines = [f"{label}: {', '.join(format_name(f) for f in self.get(relation, flag))}"
+                 for relation, label in labels if self.get(relation, flag)]
+        if self.get('config_mk', flag):
+            lines.append(f"config.mk: {', '.join(self.get('config_mk', flag))}")
+        return lines
+
+    @classmethod
+    def cached(cls, project_path, patches, cache=None):
+        """Load the graph from the cache if its source files are unchanged"""
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        cache_dir = os.path.join(base, 'suckless-patcher', 'graphs')
+        key = hashlib.sha1(os.path.abspath(project_path).encode()).hexdigest()
+        entry_path = os.path.join(cache_dir, f"{key}.json")
+        keys = {}
+        try:
+            with open(entry_path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = {}
+        known = entry.get('files', {}) if entry.get('version') == cls.VERSION else {}
+        for name in cls.FILES:
+            keys[name] = ParseCache.fingerprint(os.path.join(project_path, name), known.get(name))
+        if known and all((keys[n] or [None] * 3)[1:] == (known.get(n) or [None] * 3)[1:]
+                         for n in cls.FILES):
+            return cls(entry['graph'])
+
+        graph = cls.build(project_path, patches)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            atomic_write(entry_path, json.dumps(
+                {'version': cls.VERSION, 'files': keys, 'graph': graph.data}).encode())
+        except OSError:
+            pass
+        return graph
+
+
+class BackupStore:
+    """Content-addressed object store behind a project's .backups directory.
+
+    Snapshots are stored once as zlib-compressed blobs named by their sha256
+    under .backups/objects/, git style; each backup is a small manifest
+    `<timestamp>.json` pointing at its blobs. Saving an unchanged profile
+    again only costs a new manifest.
+
+    Every manifest is also recorded in the append-only catalog.jsonl, which
+    is what listing, paging and time-range queries read instead of opening
+    each manifest.
+    """
+    CATALOG = 'catalog.jsonl'
+
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.catalog_path = os.path.join(root, self.CATALOG)
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, zlib.compress(data))
+        return digest
+
+    def get(self, digest):
+        with open(self.object_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Corrupt backup object {digest}")
+        return data
+
+    def create(self, values, timestamp=None):
+        """Store a {flag: value} snapshot and return the manifest name"""
+        from datetime import datetime
+        os.makedirs(self.root, exist_ok=True)
+        timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+        blob = json.dumps(values, sort_keys=True, separators=(',', ':')).encode()
+        manifest = {'created': timestamp, 'objects': {'values': self.put(blob)}}
+        name = f"{timestamp}.json"
+        atomic_write(os.path.join(self.root, name), json.dumps(manifest).encode())
+        self.append_catalog(dict(manifest, name=name))
+        return name
+
+    def delete(self, name):
+        os.remove(os.path.join(self.root, name))
+        self.append_catalog({'deleted': name})
+        return self.gc()
+
+    def load(self, name):
+        """Return the {flag: value} snapshot of a backup"""
+        with open(os.path.join(self.root, name), 'r') as f:
+            manifest = json.load(f)
+        if 'objects' not in manifest:
+            # Backups written before the object store hold the values inline
+            return manifest
+        return json.loads(self.get(manifest['objects']['values']))
+
+    def append_catalog(self, record):
+        if not os.path.exists(self.catalog_path):
+            # The rebuild already sees the manifest just written or removed
+            self.rebuild_catalog()
+            return
+        with open(self.catalog_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def read_catalog(self):
+        """Return the live catalog entries, oldest first"""
+        entries = {}
+        deleted = 0
+        try:
+            f = open(self.catalog_path, 'r')
+        except FileNotFoundError:
+            return self.rebuild_catalog()
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn final line from an interrupted append
+                if 'deleted' in record:
+                    deleted += entries.pop(record['deleted'], None) is not None
+                else:
+                    entries[record['name']] = record
+        catalog = sorted(entries.values(), key=lambda e: e['created'])
+        if deleted > len(catalog):
+            self.write_catalog(catalog)
+        return catalog
+
+    def write_catalog(self, catalog):
+        atomic_write(self.catalog_path, ''.join(json.dumps(e) + '\n' for e in catalog).encode())
+
+    def rebuild_catalog(self):
+        """Recreate the catalog from the manifests on disk"""
+        if not os.path.isdir(self.root):
+            return []
+        catalog = []
+        for name in os.listdir(self.root):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.root, name), 'r') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            catalog.append({
+                'created': manifest.get('created', name[:-5]) if 'objects' in manifest else name[:-5],
+                'objects': manifest.get('objects', {}),
+                'name': name
+            })
+        catalog.sort(key=lambda e: e['created'])
+        self.write_catalog(catalog)
+        return catalog
+
+    def query(self, since=None, until=None, offset=0, limit=None):
+        """Backups created in [since, until], newest first, one page at a time.
+
+        since/until are datetimes or "%Y%m%d_%H%M%S" strings.
+        """
+        from datetime import datetime
+        catalog = self.read_catalog()
+        if isinstance(since, datetime):
+            since = since.strftime("%Y%m%d_%H%M%S")
+        if isinstance(until, datetime):
+            until = until.strftime("%Y%m%d_%H%M%S")
+        lo = bisect.bisect_left(catalog, since, key=lambda e: e['created']) if since else 0
+        hi = bisect.bisect_right(catalog, until, key=lambda e: e['created']) if until else len(catalog)
+        newest = hi - offset
+        oldest = max(lo, newest - limit) if limit is not None else lo
+        return catalog[oldest:max(newest, oldest)][::-1]
+
+    def manifests(self, **query):
+        return [entry['name'] for entry in self.query(**query)]
+
+    def gc(self):
+        """Delete blobs no manifest refers to; returns (blobs, bytes) freed"""
+        referenced = set()
+        for entry in self.read_catalog():
+            referenced.update(entry.get('objects', {}).values())
+        removed = freed = 0
+        if not os.path.isdir(self.objects_dir):
+            return removed, freed
+        for prefix in os.scandir(self.objects_dir):
+            if not prefix.is_dir():
+                continue
+            for blob in os.scandir(prefix.path):
+                if prefix.name + blob.name not in referenced:
+                    freed += blob.stat().st_size
+                    os.remove(blob.path)
+                    removed += 1
+            if not os.listdir(prefix.path):
+                os.rmdir(prefix.path)
+        return removed, freed
+
+
+def rss_mib():
+    """Resident set size of this process in MiB (Linux only)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1 << 20)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def default_search_paths():
+    return [
+        os.getcwd(),
+        os.path.expanduser("~/suckless"),
+        "/usr/local/src"
+    ]
+
+
+def iter_project_dirs(search_paths):
+    """Yield candidate project directories below each search root.
+
+    Uses the d_type scandir already returned instead of a stat per entry,
+    and skips roots that resolve to one already scanned (cwd == ~/suckless).
+    """
+    seen = set()
+    for root in search_paths:
+        real = os.path.realpath(root)
+        if real in seen:
+            continue
+        seen.add(real)
+        try:
+            entries = os.scandir(root)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        yield entry.path
+                except OSError:
+                    pass
+
+
+class SearchIndex:
+    """Inverted index over the name, description and URLs of each patch.
+
+    Built once per project when it is loaded. Every query term must match
+    somewhere in a patch; a term matches any indexed word containing it, so
+    "bar" finds awesomebar. The vocabulary is kept as one newline separated
+    string so that substring lookup is a C-level scan rather than a Python
+    loop over words. Queries that look like a regex are run against the
+    precomputed lowercase text of each patch instead.
+    """
+
+    def __init__(self, patches):
+        postings = {}
+        self.haystacks = []
+        for index, patch in enumerate(patches):
+            text = ' '.join([
+                patch['name'], patch['raw_name'],
+                *patch.get('description', []), *patch.get('urls', [])
+            ]).lower()
+            self.haystacks.append(text)
+            for word in set(WORD_RE.findall(text)):
+                postings.setdefault(word, []).append(index)
+
+        self.words = sorted(postings)
+        self.postings = [postings[word] for word in self.words]
+        self.vocabulary = '\n'.join(self.words) + '\n'
+        self.starts = []
+        pos = 0
+        for word in self.words:
+            self.starts.append(pos)
+            pos += len(word) + 1
+        self.size = len(patches)
+
+    def term(self, term):
+        """Indexes of patches containing a word that contains term"""
+        if self.vocabulary.count(term) * 8 > self.size:
+            # Short, common terms touch most postings lists; scanning the
+            # text directly is cheaper than merging them
+            return {i for i, haystack in enumerate(self.haystacks) if term in haystack}
+        hits = set()
+        find = self.vocabulary.find
+        pos = find(term)
+        while pos >= 0:
+            word = bisect.bisect_right(self.starts, pos) - 1
+            hits.update(self.postings[word])
+            # Skip to the next word, one hit per word is enough
+            pos = find(term, self.starts[word] + len(self.words[word]) + 1)
+        return hits
+
+    def query(self, text):
+        """Return the set of matching patch indexes, or None for "all" """
+        text = text.strip().lower()
+        if not text:
+            return None
+        if REGEX_CHARS.intersection(text):
+            try:
+                search = re.compile(text).search
+            except re.error:
+                return {i for i, haystack in enumerate(self.haystacks) if text in haystack}
+            return {i for i, haystack in enumerate(self.haystacks) if search(haystack)}
+
+        hits = None
+        for term in sorted(set(WORD_RE.findall(text)), key=len, reverse=True):
+            found = self.term(term)
+            hits = found if hits is None else hits & found
+            if not hits:
+                break
+        return hits if hits is not None else set()
+
+
+def write_synthetic_header(directory, flags):
+    """Write a patches.def.h/patches.h pair with `flags` entries for benchmarks"""
+    def_file = os.path.join(directory, 'patches.def.h')
+    patch_file = os.path.join(directory, 'patches.h')
+    with open(def_file, 'w') as d, open(patch_file, 'w') as p:
+        d.write("/*\n * Synthetic patch control flags.\n */\n\n")
+        for i in range(flags):
+            d.write(
+                f"/* Synthetic patch number {i} that does something useful.\n"
+                f" * It takes precedence over patch {i + 1} when both are set.\n"
+                f" * https://dwm.suckless.org/patches/synthetic{i}/\n"
+                f" */\n"
+                f"#define SYNTHETIC{i}_PATCH 0\n\n"
+            )
+            p.write(f"#define SYNTHETIC{i}_PATCH {i & 1}\n")
+    return def_file, patch_file
+
+
+def bench_parse(flags=10000, repeat=5):
+    """Time parse_patch_table on a synthetic header with `flags` entries"""
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        def_file, patch_file = write_synthetic_header(tmp, flags)
+        size = os.path.getsize(def_file)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            table = parse_patch_table(def_file, patch_file)
+            timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    print(f"{len(table)} flags, {size / 1024:.0f} KiB patches.def.h")
+    print(f"best {best * 1000:.1f} ms, mean {sum(timings) / repeat * 1000:.1f} ms "
+          f"over {repeat} runs ({len(table) / best:,.0f} flags/s)")
+    return best
+
+def bench_search(flags=20000, queries=('precedence', 'synth', 'bar', '1234', 'dwm patches 99', 'synthetic1.*5$')):
+    """Time index build and SearchIndex.query on a synthetic header"""
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        table = parse_patch_table(*write_synthetic_header(tmp, flags))
+
+    start = time.perf_counter()
+    index = SearchIndex(table)
+    print(f"{len(table)} patches, {len(index.words)} words, "
+          f"index built in {(time.perf_counter() - start) * 1000:.1f} ms")
+    for query in queries:
+        best = float('inf')
+        for _ in range(5):
+            start = time.perf_counter()
+            hits = index.query(query)
+            best = min(best, time.perf_counter() - start)
+        print(f"{query!r:>20}: {len(hits):6} hits in {best * 1000:.2f} ms")
+
+
+def build_jobs():
+    """Number of CPUs this process is allowed to run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+MAKE_RULE_RE = re.compile(r'^([^\s:=#.$%][^\s:=#$%]*)[ \t]*:(?!=)[ \t]*([^;#\n]*)', re.M)
+MAKE_PREFIX_RE = re.compile(r'^PREFIX\s*[:?]?=\s*(\S+)', re.M)
+COMPILER_VERSIONS = {}
+
+
+def make_targets(makefile):
+    """Programs a Makefile builds by default.
+
+    The prerequisites of all:, or of install: when there is no all: (the
+    dwmblocks Makefile), else the first rule, which is make's default goal.
+    """
+    rules = {}
+    for target, prerequisites in MAKE_RULE_RE.findall(makefile):
+        rules.setdefault(target, []).extend(prerequisites.split())
+    if not rules:
+        return []
+    names = rules.get('all') or rules.get('install') or [next(iter(rules))]
+    targets = []
+    for name in names:
+        if name not in ('all', 'options') and name not in targets:
+            targets.append(name)
+    return targets
+
+
+def compiler_version(cc):
+    """First line of `cc --version`, remembered per compiler"""
+    import subprocess
+    if cc not in COMPILER_VERSIONS:
+        try:
+            result = subprocess.run([cc, '--version'], stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, universal_newlines=True)
+            COMPILER_VERSIONS[cc] = result.stdout.partition('\n')[0]
+        except OSError:
+            COMPILER_VERSIONS[cc] = ''
+    return COMPILER_VERSIONS[cc]
+
+
+class BuildFingerprint:
+    """Decides whether a project needs a full, incremental or no build.
+
+    The fingerprint hashes patches.h, config.h and config.mk, the compiler
+    version and the rest of the source tree; it is saved to
+    <project>/.build-fingerprint.json after a successful install together
+    with the stat of the installed binaries. All suckless Makefiles list the
+    config headers as object prerequisites, so when only those changed a
+    plain `make` is enough. Anything else changing (compiler, sources that
+    are #included without being prerequisites) gets `make clean` first.
+    """
+    FILE = '.build-fingerprint.json'
+    CONFIG_FILES = ('patches.h', 'config.h', 'config.mk')
+    SOURCE_SUFFIXES = ('.c', '.h', '.mk', 'Makefile')
+
+    def __init__(self, path):
+        self.path = path
+        self.record_path = os.path.join(path, self.FILE)
+
+    def read_text(self, name):
+        try:
+            with open(os.path.join(self.path, name), 'r', errors='replace') as f:
+                return f.read()
+        except OSError:
+            return ''
+
+    def file_hash(self, name):
+        try:
+            with open(os.path.join(self.path, name), 'rb') as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+
+    def tree_hash(self, known=None):
+        """sha256 over the source files' hashes.
+
+        `known` maps relative paths to ParseCache fingerprints from an
+        earlier run; files whose mtime and size match are not read again.
+        The fingerprints used are left in self.tree_files.
+        """
+        known = known or {}
+        self.tree_files = {}
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(self.path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                rel = os.path.relpath(os.path.join(root, name), self.path)
+                if rel in self.CONFIG_FILES or not name.endswith(self.SOURCE_SUFFIXES):
+                    continue
+                try:
+                    key = ParseCache.fingerprint(os.path.join(self.path, rel), known.get(rel))
+                except OSError:
+                    key = None
+                if key:
+                    self.tree_files[rel] = key
+                digest.update(rel.encode() + b'\0' + (key[2] if key else '').encode())
+        return digest.hexdigest()
+
+    def compute(self):
+        makefiles = self.read_text('config.mk') + self.read_text('Makefile')
+        cc = re.search(r'^CC\s*[:?]?=\s*(\S+)', makefiles, re.M)
+        return {
+            'config': {name: self.file_hash(name) for name in self.CONFIG_FILES},
+            'compiler': compiler_version(cc.group(1) if cc else 'cc'),
+            'tree': self.tree_hash()
+        }
+
+    def targets(self):
+        """Programs built by a plain `make`"""
+        return make_targets(self.read_text('Makefile'))
+
+    def bindir(self):
+        prefix = MAKE_PREFIX_RE.search(self.read_text('config.mk') + self.read_text('Makefile'))
+        return os.path.join(prefix.group(1) if prefix else '/usr/local', 'bin')
+
+    def binaries(self):
+        """Paths `make install` puts the project's programs at"""
+        return [os.path.join(self.bindir(), t) for t in self.targets()]
+
+    def load(self):
+        try:
+            with open(self.record_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, fingerprint, installed=True):
+        """Record a successful build; installed=False after a compile only.
+
+        A compile-only record has no installed binaries, so plan() still
+        asks for an (incremental) build and install but not for make clean.
+        """
+        stats = {}
+        for binary in self.binaries() if installed else []:
+            if os.path.exists(binary):
+                st = os.stat(binary)
+                stats[binary] = [st.st_size, st.st_mtime_ns]
+        record = dict(fingerprint, installed=stats)
+        try:
+            atomic_write(self.record_path, json.dumps(record, indent=2).encode())
+        except OSError as e:
+            print(f"Could not save build fingerprint: {e}")
+
+    def plan(self):
+        """Return ('up to date'|'incremental'|'full', fingerprint)"""
+        fingerprint = self.compute()
+        previous = self.load()
+        if not previous or previous.get('compiler') != fingerprint['compiler'] \
+                or previous.get('tree') != fingerprint['tree']:
+            return 'full', fingerprint
+        if previous.get('config') != fingerprint['config']:
+            return 'incremental', fingerprint
+        installed = previous.get('installed') or {}
+        for binary, (size, mtime_ns) in installed.items():
+            try:
+                st = os.stat(binary)
+            except OSError:
+                return 'incremental', fingerprint
+            if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                return 'incremental', fingerprint
+        return ('up to date' if installed else 'incremental'), fingerprint
+
+
+CPP_INCLUDE_RE = re.compile(r'^[ \t]*#[ \t]*include[ \t]+"([^"]+)"')
+
+
+class CodeIndex:
+    """Which lines of the C sources each patch flag switches on.
+
+    A preprocessor-conditional scan, not a compile: starting from the
+    top-level .c files and following local #includes, every line is owned
+    by the _PATCH flags of the innermost #if/#elif that names one (all of
+    them for `A || B`, the first for `A && B`). Code included from inside
+    such a block belongs to the same flags. config.h and patches.h are not
+    followed so the result only depends on the source tree, whose hash
+    keys the JSON cache under $XDG_CACHE_HOME/suckless-patcher/code-index.
+    The (mtime_ns, size, sha256) of each source file is kept per project
+    under code-index/trees, so a warm start only stats the tree.
+    Object size is a rough estimate from the number of code lines.
+    """
+    VERSION = 2
+    BYTES_PER_LINE = 24
+    SKIP = ('config.h', 'patches.h', 'config.def.h', 'patches.def.h')
+
+    def __init__(self, data):
+        self.data = data
+
+    @staticmethod
+    def owners(expr, outer, flags):
+        positive = [name[:-len('_PATCH')] for name in re.findall(r'(?<!!)\b(\w+_PATCH)\b', expr)]
+        positive = [flag for flag in positive if flag in flags]
+        if not positive:
+            return outer
+        return tuple(positive) if '||' in expr else positive[:1]
+
+    @classmethod
+    def build(cls, project_path, flags):
+        flags = set(flags)
+        data = {}
+        seen = set()
+
+        def record(flag, rel, lineno, code):
+            entry = data.setdefault(flag, {'files': {}, 'lines': 0})
+            ranges = entry['files'].setdefault(rel, [])
+            if ranges and ranges[-1][1] == lineno - 1:
+                ranges[-1][1] = lineno
+            else:
+                ranges.append([lineno, lineno])
+            entry['lines'] += code
+
+        def scan(rel, owners):
+            if rel in seen:
+                return
+            seen.add(rel)
+            try:
+                with open(os.path.join(project_path, rel), 'r', errors='replace') as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                return
+            stack = []  # owners outside each open #if
+            current = owners
+            for lineno, line in enumerate(lines, 1):
+                m = CPP_DIRECTIVE_RE.match(line)
+                if m:
+                    directive, expr = m.groups()
+                    if directive in ('if', 'ifdef', 'ifndef'):
+                        stack.append(current)
+                        current = cls.owners(expr, current, flags) if directive == 'if' else current
+                    elif stack and directive == 'elif':
+                        current = cls.owners(expr, stack[-1], flags)
+                    elif stack and directive == 'else':
+                        current = stack[-1]
+                    elif stack and directive == 'endif':
+                        current = stack.pop()
+                    continue
+                m = CPP_INCLUDE_RE.match(line)
+                if m:
+                    for flag in current:
+                        record(flag, rel, lineno, False)
+                    target = os.path.normpath(os.path.join(os.path.dirname(rel), m.group(1)))
+                    if os.path.basename(target) not in cls.SKIP:
+                        scan(target, current)
+                    continue
+                stripped = line.strip()
+                code = bool(stripped) and not stripped.startswith(('//', '/*', '*'))
+                for flag in current:
+                    record(flag, rel, lineno, code)
+
+        roots = sorted(f for f in os.listdir(project_path) if f.endswith('.c'))
+        for root in roots:
+            scan(root, ())
+        return cls(data)
+
+    def lines(self, flag):
+        return self.data.get(flag, {}).get('lines', 0)
+
+    def flags_at(self, rel, lineno):
+        """Flags whose blocks contain line lineno of file rel"""
+        if not hasattr(self, 'by_file'):
+            self.by_file = {}
+            for flag, entry in self.data.items():
+                for name, ranges in entry['files'].items():
+                    self.by_file.setdefault(name, []).extend((a, b, flag) for a, b in ranges)
+            for ranges in self.by_file.values():
+                ranges.sort()
+        ranges = self.by_file.get(os.path.normpath(rel), [])
+        end = bisect.bisect_right(ranges, (lineno, float('inf')))
+        return [flag for start, stop, flag in ranges[:end] if stop >= lineno]
+
+    def estimate(self, flag):
+        """Short "+lines, ~size" text for the patch list"""
+        lines = self.lines(flag)
+        if not lines:
+            return ""
+        size = lines * self.BYTES_PER_LINE
+        size = f"~{size / 1024:.1f} KiB" if size >= 1024 else f"~{size} B"
+        return f"+{lines} lines, {size}"
+
+    @classmethod
+    def cached(cls, project_path, flags):
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        cache_dir = os.path.join(base, 'suckless-patcher', 'code-index')
+        key = hashlib.sha1(os.path.abspath(project_path).encode()).hexdigest()
+        files_path = os.path.join(cache_dir, 'trees', f"{key}.json")
+        try:
+            with open(files_path, 'r') as f:
+                known = json.load(f)
+            known = known['files'] if known.get('version') == cls.VERSION else {}
+        except (OSError, ValueError, KeyError):
+            known = {}
+        fingerprint = BuildFingerprint(project_path)
+        tree = fingerprint.tree_hash(known)
+        if fingerprint.tree_files != known:
+            try:
+                os.makedirs(os.path.dirname(files_path), exist_ok=True)
+                atomic_write(files_path, json.dumps(
+                    {'version': cls.VERSION, 'files': fingerprint.tree_files}).encode())
+            except OSError:
+                pass
+        entry_path = os.path.join(cache_dir, f"{tree}.json")
+        try:
+            with open(entry_path, 'r') as f:
+                entry = json.load(f)
+            if entry.get('version') == cls.VERSION:
+                return cls(entry['index'])
+        except (OSError, ValueError):
+            pass
+
+        index = cls.build(project_path, flags)
+        try:
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            atomic_write(entry_path, json.dumps({'version': cls.VERSION, 'index': index.data}).encode())
+        except OSError:
+            pass
+        return index
+
+
+DIAGNOSTIC_RE = re.compile(r'^(.+?):(\d+):(?:(\d+):)?\s*(fatal error|error): (.*)$', re.M)
+COMPILE_LINE_RE = re.compile(r'(?:^|\s)-c(?=\s)')
+
+
+def syntax_check(path):
+    """Compile the project's sources with -fsyntax-only, as the normal user.
+
+    The compile commands come from `make -n -B`, so they carry the
+    project's own CC, CFLAGS and pkg-config calls; each one runs with -c
+    swapped for -fsyntax-only, all sources in parallel. Returns the errors
+    as dicts with file, line, column, message and the patch flags whose
+    #if blocks contain that line.
+    """
+    import subprocess
+    if not os.path.exists(os.path.join(path, 'config.h')):
+        return []  # make generates it from config.def.h on the real build
+    dry = subprocess.run(['make', '-n', '-B'], cwd=path, stdout=subprocess.PIPE,
+                         stderr=subprocess.DEVNULL, universal_newlines=True)
+    commands = [
+        COMPILE_LINE_RE.sub(' -fsyntax-only', re.sub(r'\s-o\s+\S+', '', line), count=1)
+        for line in dry.stdout.splitlines()
+        if COMPILE_LINE_RE.search(line) and re.search(r'\S\.c(?:\s|$)', line)
+    ]
+    if not commands:
+        return []
+
+    def run(command):
+        return subprocess.run(command, shell=True, cwd=path, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, universal_newlines=True).stdout
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=build_jobs()) as pool:
+        output = ''.join(pool.map(run, commands))
+
+    flags = []
+    if os.path.exists(os.path.join(path, 'patches.def.h')):
+        flags = [patch['raw_name'] for patch in parse_patch_table(
+            os.path.join(path, 'patches.def.h'), os.path.join(path, 'patches.h'))]
+    code = CodeIndex.cached(path, flags)
+
+    errors = []
+    seen = set()
+    for name, line, column, level, message in DIAGNOSTIC_RE.findall(output):
+        rel = os.path.relpath(os.path.join(path, name), path)
+        key = (rel, line, message)
+        if key in seen:
+            continue  # headers included from several sources
+        seen.add(key)
+        errors.append({
+            'file': rel, 'line': int(line), 'column': int(column or 0),
+            'level': level, 'message': message,
+            'flags': code.flags_at(rel, int(line))
+        })
+    return errors
+
+
+def format_diagnostic(error):
+    flags = f" [{', '.join(f + '_PATCH' for f in error['flags'])}]" if error['flags'] else ''
+    return f"{error['file']}:{error['line']}: {error['level']}: {error['message']}{flags}"
+
+
+class ArtifactCache:
+    """Built binaries kept under $XDG_CACHE_HOME, keyed by build fingerprint.
+
+    Switching back to a patch profile that was built before then only costs
+    an install. Entries are directories named by the fingerprint hash; their
+    mtime is bumped on every hit and the least recently used ones are
+    removed once the cache grows past max_bytes.
+    """
+    MAX_BYTES = 256 << 20
+
+    def __init__(self, cache_dir=None, max_bytes=MAX_BYTES):
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        self.cache_dir = cache_dir or os.path.join(base, 'suckless-patcher', 'artifacts')
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(name, fingerprint):
+        return hashlib.sha256(json.dumps([name, fingerprint], sort_keys=True).encode()).hexdigest()
+
+    def lookup(self, key):
+        """Return the cached binary paths for key, or None"""
+        entry = os.path.join(self.cache_dir, key)
+        try:
+            files = [f.path for f in os.scandir(entry) if f.is_file()]
+        except FileNotFoundError:
+            return None
+        if not files:
+            return None
+        os.utime(entry)
+        return sorted(files)
+
+    def store(self, key, binaries):
+        """Copy the existing ones of binaries into the cache under key"""
+        import shutil
+        import tempfile
+        binaries = [b for b in binaries if os.path.isfile(b)]
+        if not binaries:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            for binary in binaries:
+                shutil.copy2(binary, tmp)
+            entry = os.path.join(self.cache_dir, key)
+            if os.path.isdir(entry):
+                shutil.rmtree(entry)
+            os.replace(tmp, entry)
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            print(f"Could not cache build artifacts: {e}")
+            return
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until under max_bytes"""
+        import shutil
+        entries = []
+        total = 0
+        try:
+            scan = list(os.scandir(self.cache_dir))
+        except FileNotFoundError:
+            return
+        for entry in scan:
+            if not entry.is_dir() or entry.name.startswith('.'):
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            entries.append((entry.stat().st_mtime_ns, size, entry.path))
+            total += size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+class BuildQueue:
+    """Compile several projects at once, then install them one by one.
+
+    Compiling (make clean, make -jN) runs unprivileged and concurrently,
+    with the CPUs from the affinity mask split between the projects.
+    Installing needs root, so `sudo make install` runs afterwards in queue
+    order, only for projects that compiled. on_output(text) is called from
+    worker threads with each line prefixed by the project name.
+    """
+    ORDER = ('dwm', 'st', 'slock', 'dwmblocks')
+
+    def __init__(self, projects, password=None, on_output=None, jobs=None):
+        # projects: [(name, path)]; known suckless tools go first, in ORDER
+        rank = {name: i for i, name in enumerate(self.ORDER)}
+        self.projects = sorted(projects, key=lambda p: rank.get(p[0], len(rank)))
+        self.password = password
+        self.on_output = on_output or (lambda text: print(text, end=''))
+        self.jobs = max(1, (jobs or build_jobs()) // max(1, len(self.projects)))
+        self.artifacts = ArtifactCache()
+        self.status = {}
+        self.errors = {}
+
+    def run_command(self, name, path, argv, stdin_text=None):
+        import subprocess
+        process = subprocess.Popen(
+            argv,
+            cwd=path,
+            stdin=subprocess.PIPE if stdin_text is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            bufsize=1
+        )
+        if stdin_text is not None:
+            process.stdin.write(stdin_text)
+            process.stdin.close()
+        for line in process.stdout:
+            self.on_output(f"[{name}] {line}")
+        return process.wait()
+
+    def compile(self, name, path):
+        """Returns (result, fingerprint), result being True, False, 'up to date' or 'cached'"""
+        import shutil
+        plan, fingerprint = BuildFingerprint(path).plan()
+        if plan == 'up to date':
+            self.on_output(f"[{name}] up to date, nothing to build\n")
+            return plan, fingerprint
+        cached = self.artifacts.lookup(ArtifactCache.key(name, fingerprint))
+        if cached:
+            # The cached binaries go into the tree and `make install` puts
+            # them in place, so setuid bits, man pages and terminfo are
+            # handled by the Makefile as usual. The objects in the tree are
+            # still stale; make rebuilds them from the newer config headers
+            # next time.
+            try:
+                for binary in cached:
+                    shutil.copy(binary, os.path.join(path, os.path.basename(binary)))
+            except OSError as e:
+                self.on_output(f"[{name}] could not use the artifact cache: {e}\n")
+            else:
+                self.on_output(f"[{name}] found in artifact cache, skipping compile\n")
+                return 'cached', fingerprint
+        errors = syntax_check(path)
+        if errors:
+            self.errors[name] = errors
+            for error in errors:
+                self.on_output(f"[{name}] {format_diagnostic(error)}\n")
+            self.on_output(f"[{name}] syntax check failed, not building\n")
+            return False, fingerprint
+        self.on_output(f"[{name}] {plan} build\n")
+        steps = [['make', f'-j{self.jobs}']]
+        if plan == 'full':
+            steps.insert(0, ['make', 'clean'])
+        for argv in steps:
+            if self.run_command(name, path, argv) != 0:
+                return False, fingerprint
+        BuildFingerprint(path).save(fingerprint, installed=False)
+        return True, fingerprint
+
+    def run(self):
+        """Build everything; returns {name: 'installed'|'up to date'|'compiled'|'failed'}"""
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(1, len(self.projects))) as pool:
+            compiled = {name: pool.submit(self.compile, name, path)
+                        for name, path in self.projects}
+        for name, path in self.projects:
+            result, fingerprint = compiled[name].result()
+            project = BuildFingerprint(path)
+            key = ArtifactCache.key(name, fingerprint)
+            if result == 'up to date':
+                self.status[name] = result
+            elif not result:
+                self.status[name] = 'failed'
+            elif self.password is None:
+                self.status[name] = 'compiled' if result is True else result
+            elif result == 'cached':
+                # -o keeps make from relinking the binaries compile() copied
+                # in because their (stale) objects are older than config.h
+                argv = ['sudo', '-S', '-p', '', 'make']
+                for target in project.targets():
+                    argv += ['-o', target]
+                if self.run_command(name, path, argv + ['install'], self.password + '\n') == 0:
+                    project.save(fingerprint)
+                    self.status[name] = 'installed'
+                else:
+                    self.status[name] = 'failed'
+            elif self.run_command(name, path, ['sudo', '-S', '-p', '', 'make', 'install'],
+                                  self.password + '\n') == 0:
+                project.save(fingerprint)
+                self.artifacts.store(key, [os.path.join(path, t) for t in project.targets()])
+                self.status[name] = 'installed'
+            else:
+                self.status[name] = 'failed'
+        self.password = None
+        return self.status
+
+
+BENCH_COLUMNS = ('flag', 'value', 'built', 'seconds', 'text', 'data', 'bss', 'total',
+                 'delta_seconds', 'delta_total', 'error')
+
+
+def build_variant(project_path, workdir, flag=None, value=None):
+    """Process pool worker: build one copy of the tree with flag set to value.
+
+    Returns a row for bench_matrix; flag None builds the base profile.
+    """
+    import shutil
+    import subprocess
+    tree = os.path.join(workdir, 'base' if flag is None else f"{flag}-{value}")
+    shutil.copytree(project_path, tree, symlinks=True,
+                    ignore=shutil.ignore_patterns('.*', '*.o', '*.orig', '*.rej'))
+    patch_file = os.path.join(tree, 'patches.h')
+    if flag is not None:
+        write_patch_values(patch_file, [{'raw_name': flag, 'value': value}])
+    # Same config.mk edits as a save, so patches that need extra libraries link
+    config_file = os.path.join(tree, 'config.mk')
+    if os.path.exists(config_file):
+        enabled = [name for name, v in read_patch_values(patch_file).items() if v]
+        update_config_mk(tree, parse_config_mk(config_file), enabled)
+
+    target = (BuildFingerprint(tree).targets() or [os.path.basename(project_path)])[0]
+    row = {'flag': flag or '(base)', 'value': '' if value is None else value, 'built': 0,
+           'seconds': 0.0, 'text': 0, 'data': 0, 'bss': 0, 'total': 0}
+    started = time.perf_counter()
+    result = subprocess.run(['make', target], cwd=tree, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, universal_newlines=True)
+    row['seconds'] = round(time.perf_counter() - started, 2)
+    binary = os.path.join(tree, target)
+    if result.returncode == 0 and os.path.exists(binary):
+        row['built'] = 1
+        try:
+            size = subprocess.run(['size', binary], stdout=subprocess.PIPE,
+                                  universal_newlines=True).stdout.splitlines()[-1].split()
+            row['text'], row['data'], row['bss'], row['total'] = map(int, size[:4])
+        except (OSError, IndexError, ValueError):
+            row['total'] = os.path.getsize(binary)
+    else:
+        row['error'] = (result.stdout.strip().splitlines() or [''])[-1].replace('\t', ' ')
+    shutil.rmtree(tree, ignore_errors=True)
+    return row
+
+
+def bench_matrix(project_path, flags=None, jobs=None, output=None):
+    """Flip each flag of the current patches.h, build every variant and tabulate.
+
+    Each variant is a separate copy of the tree built with plain `make` in a
+    process pool, one variant per CPU. The table is written as TSV sorted by
+    flag, so two runs can be compared with `diff` or --bench-diff.
+    """
+    import tempfile
+    from datetime import datetime
+    project_path = os.path.abspath(project_path)
+    table = parse_patch_table(os.path.join(project_path, 'patches.def.h'),
+                              os.path.join(project_path, 'patches.h'))
+    values = {patch['raw_name']: patch['value'] for patch in table}
+    flags = flags or sorted(values)
+    unknown = [flag for flag in flags if flag not in values]
+    if unknown:
+        raise ValueError(f"Unknown flag(s): {', '.join(unknown)}")
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    rows = []
+    with tempfile.TemporaryDirectory(prefix='suckless-bench-') as workdir:
+        with ProcessPoolExecutor(max_workers=jobs or build_jobs()) as pool:
+            base = pool.submit(build_variant, project_path, workdir)
+            futures = [pool.submit(build_variant, project_path, workdir, flag, int(not values[flag]))
+                       for flag in flags]
+            base = base.result()
+            for future in as_completed(futures):
+                row = future.result()
+                rows.append(row)
+                print(f"{row['flag']}={row['value']}: "
+                      f"{'built' if row['built'] else 'FAILED'} in {row['seconds']}s, {row['total']} bytes")
+
+    for row in rows:
+        row['delta_seconds'] = round(row['seconds'] - base['seconds'], 2)
+        row['delta_total'] = row['total'] - base['total'] if row['built'] and base['built'] else ''
+    base['delta_seconds'] = base['delta_total'] = 0
+    rows = [base] + sorted(rows, key=lambda row: row['flag'])
+
+    output = output or os.path.join(
+        project_path, '.bench', f"matrix-{datetime.now().strftime('%Y%m%d_%H%M%S')}.tsv")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        f.write('\t'.join(BENCH_COLUMNS) + '\n')
+        for row in rows:
+            f.write('\t'.join(str(row.get(column, '')) for column in BENCH_COLUMNS) + '\n')
+    print(f"base: {'built' if base['built'] else 'FAILED'} in {base['seconds']}s, "
+          f"{base['total']} bytes; results in {output}")
+    return rows
+
+
+def read_bench_table(path):
+    with open(path, 'r') as f:
+        lines = f.read().splitlines()
+    columns = lines[0].split('\t')
+    return {row['flag']: row for row in (dict(zip(columns, line.split('\t'))) for line in lines[1:])}
+
+
+def bench_diff(old_path, new_path):
+    """Print per-flag changes in build status, time and size between two runs"""
+    old, new = read_bench_table(old_path), read_bench_table(new_path)
+    for flag in sorted(set(old) | set(new)):
+        before, after = old.get(flag), new.get(flag)
+        if not before or not after:
+            print(f"{flag}: only in {'new' if after else 'old'} run")
+            continue
+        changes = []
+        if before['built'] != after['built']:
+            changes.append('now builds' if after['built'] == '1' else 'no longer builds')
+        seconds = float(after['seconds']) - float(before['seconds'])
+        if abs(seconds) >= 0.5:
+            changes.append(f"{seconds:+.1f}s")
+        if before['total'] != after['total']:
+            changes.append(f"{int(after['total']) - int(before['total']):+d} bytes")
+        if changes:
+            print(f"{flag}: {', '.join(changes)}")
+
+
+BLOCK_RE = re.compile(r'\{\s*("(?:[^"\\]|\\.)*")\s*,\s*("(?:[^"\\]|\\.)*")\s*,\s*(\d+)\s*,\s*(\d+)\s*\}')
+C_COMMENT_RE = re.compile(r'/\*.*?\*/|//[^\n]*', re.S)
+# Environment a block command gets when sampled; BLOCK_BUTTON stays unset so
+# scripts take their display path rather than a click action
+BLOCK_ENV = ('PATH', 'HOME', 'USER', 'LANG', 'LC_ALL', 'DISPLAY', 'WAYLAND_DISPLAY',
+             'XDG_RUNTIME_DIR', 'DBUS_SESSION_BUS_ADDRESS')
+
+
+def parse_blocks(config_file):
+    """Return the live entries of a dwmblocks blocks[] as dicts.
+
+    Commented-out blocks are blanked first (keeping newlines so line
+    numbers stay right).
+    """
+    with open(config_file, encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    text = C_COMMENT_RE.sub(lambda m: re.sub(r'[^\n]', ' ', m.group()), text)
+    start = text.find('blocks[]')
+    if start < 0:
+        return []
+    end = text.find('};', start)
+    blocks = []
+    for m in BLOCK_RE.finditer(text, start, end if end > 0 else len(text)):
+        icon, command = (json.loads(literal) if '\\' not in literal else literal[1:-1]
+                         for literal in m.group(1, 2))
+        blocks.append({
+            'icon': icon,
+            'command': command,
+            'interval': int(m.group(3)),
+            'signal': int(m.group(4)),
+            'line': text.count('\n', 0, m.start()) + 1
+        })
+    return blocks
+
+
+def sample_block(command, runs=3, timeout=5.0):
+    """Run a block command like dwmblocks' popen does and measure it.
+
+    Each run gets a scratch working directory, a trimmed environment, no
+    stdin, its own session and a CPU rlimit, and the whole process group is
+    killed afterwards or on timeout. Returns median wall and CPU seconds.
+    """
+    import subprocess
+    import tempfile
+    env = {name: os.environ[name] for name in BLOCK_ENV if name in os.environ}
+    # Limits are set by the shell itself: a preexec_fn can deadlock the
+    # child when, as from the GUI, this runs next to other threads
+    cpu = max(1, math.ceil(timeout))
+    limits = f"ulimit -S -t {cpu}; ulimit -H -t {cpu + 1}; ulimit -c 0; "
+
+    walls, cpus, output, timeouts, status = [], [], '', 0, 0
+    with tempfile.TemporaryDirectory(prefix='block-sample-') as scratch:
+        for _ in range(runs):
+            killed = []
+
+            def kill(pid):
+                killed.append(pid)
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+            start = time.perf_counter()
+            proc = subprocess.Popen(['/bin/sh', '-c', limits + command], cwd=scratch, env=env,
+                                    stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, start_new_session=True)
+            timer = threading.Timer(timeout, kill, (proc.pid,))
+            timer.start()
+            output = proc.stdout.read().decode(errors='replace').split('\n')[0]
+            proc.stdout.close()
+            # wait4 rather than Popen.wait: it hands back the rusage of this
+            # child and everything it waited for, independent of other threads
+            _, wait_status, usage = os.wait4(proc.pid, 0)
+            walls.append(time.perf_counter() - start)
+            timer.cancel()
+            proc.returncode = status = os.waitstatus_to_exitcode(wait_status)
+            kill(proc.pid)  # leftovers the script backgrounded
+            if len(killed) > 1:
+                timeouts += 1
+            cpus.append(usage.ru_utime + usage.ru_stime)
+
+    walls.sort()
+    cpus.sort()
+    return {
+        'wall': walls[len(walls) // 2],
+        'cpu': cpus[len(cpus) // 2],
+        'status': status,
+        'timeouts': timeouts,
+        'output': output
+    }
+
+
+def block_timer(intervals):
+    """dwmblocks' alarm period: the gcd of the non-zero intervals"""
+    timer = 0
+    for interval in intervals:
+        if interval:
+            timer = math.gcd(timer, interval)
+    return timer
+
+
+def block_load(blocks, samples, intervals=None):
+    """Timer wakeups, command runs and CPU seconds per hour for a schedule"""
+    if intervals is None:
+        intervals = [block['interval'] for block in blocks]
+    timer = block_timer(intervals)
+    runs = sum(3600 / interval for interval in intervals if interval)
+    cpu = sum(3600 / interval * samples[i]['cpu'] for i, interval in enumerate(intervals) if interval)
+    return {'wakeups': 3600 / timer if timer else 0, 'runs': runs, 'cpu': cpu}
+
+
+def block_report(blocks, samples):
+    """Cost of the current schedule and suggestions to cut wakeups and forks"""
+    intervals = [block['interval'] for block in blocks]
+    load = block_load(blocks, samples)
+    lines = [f"{len(blocks)} blocks, timer every {block_timer(intervals) or '-'} s: "
+             f"{load['wakeups']:.0f} wakeups, {load['runs']:.0f} command runs "
+             f"and {load['cpu']:.1f} CPU-s per hour"]
+
+    # dwmblocks runs every due block one after another from its single loop,
+    # so blocks due on the same tick delay the status bar by their sum
+    timer = block_timer(intervals)
+    if timer:
+        period = min(3600, math.lcm(*[i for i in intervals if i]))
+        worst = max(range(0, period, timer), key=lambda tick: sum(
+            samples[i]['wall'] for i, interval in enumerate(intervals) if interval and tick % interval == 0))
+        due = [i for i, interval in enumerate(intervals) if interval and worst % interval == 0]
+        lines.append(f"Busiest tick (t = {worst} s mod {period}): {len(due)} blocks forked back to back, "
+                     f"{sum(samples[i]['wall'] for i in due) * 1000:.0f} ms before the bar updates")
+
+    # Interval alignment: rounding every interval up to a multiple of a
+    # common base raises the gcd, so the timer fires less often
+    candidates = sorted({i for i in intervals if i} | {2, 5, 10, 15, 30, 60})
+    best = None
+    for base in candidates:
+        if base <= timer:
+            continue
+        aligned = [max(base, -(-i // base) * base) if i else 0 for i in intervals]
+        if any(new > 3 * old for new, old in zip(aligned, intervals) if old):
+            continue
+        result = block_load(blocks, samples, aligned)
+        if best is None or result['wakeups'] < best[1]['wakeups']:
+            best = (base, result, aligned)
+    if best:
+        base, result, aligned = best
+        changes = ', '.join(f"{blocks[i]['command']} {old}->{new}s"
+                            for i, (old, new) in enumerate(zip(intervals, aligned)) if old != new)
+        lines.append(f"Align intervals to multiples of {base} s ({changes}): wakeups "
+                     f"{load['wakeups']:.0f}->{result['wakeups']:.0f}/h, runs "
+                     f"{load['runs']:.0f}->{result['runs']:.0f}/h, CPU "
+                     f"{load['cpu']:.1f}->{result['cpu']:.1f} s/h")
+
+    # Blocks that already have a signal can be pushed by the event source
+    # (pkill -RTMIN+n dwmblocks) and only poll as a slow fallback
+    for i, block in enumerate(blocks):
+        if block['signal'] and 0 < block['interval'] < 60:
+            saved = 3600 / block['interval'] - 60
+            lines.append(f"{block['command']}: polls every {block['interval']} s but has signal "
+                         f"{block['signal']}; send 'pkill -RTMIN+{block['signal']} dwmblocks' on change "
+                         f"and poll every 60 s instead ({saved:.0f} fewer runs, "
+                         f"{saved * samples[i]['cpu']:.1f} CPU-s per hour)")
+    return lines
+
+
+def profile_blocks(project_path, runs=3):
+    """Sample every block of a dwmblocks tree and print the cost report"""
+    blocks = parse_blocks(os.path.join(project_path, 'config.h'))
+    samples = []
+    print(f"{'command':<40} {'every':>6} {'sig':>4} {'wall ms':>8} {'cpu ms':>7} {'cpu-s/h':>8}")
+    for block in blocks:
+        sample = sample_block(block['command'], runs)
+        samples.append(sample)
+        per_hour = 3600 / block['interval'] * sample['cpu'] if block['interval'] else 0
+        flags = ' timeout' if sample['timeouts'] else (f" exit {sample['status']}" if sample['status'] else '')
+        print(f"{block['command'][:40]:<40} {block['interval'] or '-':>6} {block['signal']:>4} "
+              f"{sample['wall'] * 1000:>8.1f} {sample['cpu'] * 1000:>7.1f} {per_hour:>8.2f}{flags}")
+    for line in block_report(blocks, samples):
+        print(line)
+
+
+def load_project(path, parse_cache=None):
+    """Parse the project in path; None unless it is a flexipatch or dwmblocks tree.
+
+    Shared by the GUI and the command line. The search, graph and code
+    indexes only the GUI needs are left to project_index().
+    """
+    def_file = os.path.join(path, 'patches.def.h')
+    patch_file = os.path.join(path, 'patches.h')
+    config_file = os.path.join(path, 'config.mk')
+
+    if not os.path.exists(def_file):
+        return load_blocks_project(path)
+
+    parse_cache = parse_cache or ParseCache()
+    # lookup() stats the three files anyway; reuse that for the rest
+    keys, entry = parse_cache.lookup(path)
+    if not keys['patches.h']:
+        return None
+    if entry:
+        patches, config = entry['patches'], entry['config']
+    else:
+        patches = parse_patch_table(def_file, patch_file)
+        config = parse_config_mk(config_file) if keys['config.mk'] else {}
+        parse_cache.store(path, keys, patches, config)
+    project = {
+        'name': os.path.basename(path),
+        'path': path,
+        'type': 'flexipatch',
+        'patches': patches,
+        'config': config,
+        'by_flag': {patch['raw_name']: patch for patch in patches}
+    }
+    return project
+
+
+def project_index(project, name):
+    """The 'index', 'graph' or 'code' index of a flexipatch project.
+
+    Built on first use and kept in the project dict, so a start that never
+    opens a tab or searches doesn't pay for them; the graph and code index
+    come from their on-disk caches when the sources are unchanged.
+    """
+    if name not in project:
+        patches = project['patches']
+        if name == 'index':
+            project[name] = SearchIndex(patches)
+        elif name == 'graph':
+            project[name] = PatchGraph.cached(project['path'], patches)
+        else:
+            project[name] = CodeIndex.cached(project['path'], [patch['raw_name'] for patch in patches])
+    return project[name]
+
+
+def load_blocks_project(path):
+    """A dwmblocks tree: no patch flags, a blocks[] table to profile"""
+    config_file = os.path.join(path, 'config.h')
+    if not os.path.exists(os.path.join(path, 'dwmblocks.c')) or not os.path.exists(config_file):
+        return None
+    return {
+        'name': os.path.basename(path),
+        'path': path,
+        'type': 'dwmblocks',
+        'blocks': parse_blocks(config_file),
+        'samples': None,
+        'patches': [],
+        'config': {},
+        'index': SearchIndex([])
+    }
+
+
+def config_mk_lines(config, enabled_patches):
+    """config.mk lines with those the enabled patches need uncommented"""
+    new_config = config['raw'].copy()
+    for patch_name in enabled_patches:
+        # patches carry the bare flag name, the pattern table the full macro
+        for key in (patch_name, f"{patch_name}_PATCH"):
+            for entry in config.get(key, []):
+                if entry['commented']:
+                    new_config[entry['line']] = entry['original'].lstrip('#') + '\n'
+    return new_config
+
+
+def update_config_mk(project_path, config, enabled_patches):
+    """Uncomment the config.mk lines the enabled patches need"""
+    if not config:
+        return
+    new_config = config_mk_lines(config, enabled_patches)
+    if new_config != config['raw']:
+        config_file = os.path.join(project_path, 'config.mk')
+        atomic_write(config_file, ''.join(new_config).encode())
+        config.update(parse_config_mk(config_file))
+
+
+def backup_store(project_path):
+    return BackupStore(os.path.join(project_path, '.backups'))
+
+
+def save_project(project, parse_cache=None, backup=True):
+    """Write a project's patch values to patches.h and config.mk.
+
+    Backs the values up unless backup is False and refreshes the parse
+    cache. Returns the changed flags.
+    """
+    path = project['path']
+    changed = write_patch_values(os.path.join(path, 'patches.h'), project['patches'])
+    update_config_mk(path, project['config'], [p['raw_name'] for p in project['patches'] if p['value']])
+    if backup:
+        backup_store(path).create({p['raw_name']: p['value'] for p in project['patches']})
+    # The in-memory table now matches disk; cache it so the next start is a hit
+    parse_cache = parse_cache or ParseCache()
+    parse_cache.store(path, parse_cache.keys(path), project['patches'], project['config'])
+    return changed
+
+
+def stage_profile(projects, profile):
+    """Validate a {project: [enabled flags]} profile and compute its file edits.
+
+    Flags are checked against each project's patches.def.h table; every
+    unknown one is reported in a single ValueError before anything is
+    touched. Listed flags are enabled and the project's others disabled.
+    Returns (steps, skipped): one step per project with changes, holding
+    its new values, the changed flags and the new file contents by path.
+    """
+    if not isinstance(profile, dict) or not all(isinstance(v, list) for v in profile.values()):
+        raise ValueError("A profile maps project names to lists of flags")
+    steps = []
+    skipped = []
+    unknown = []
+    for name in sorted(profile):
+        project = projects.get(name)
+        if project is None or project['type'] != 'flexipatch':
+            skipped.append(name)
+            continue
+        enabled = {flag_name(flag) for flag in profile[name]}
+        unknown.extend(f"{name}:{flag}" for flag in sorted(enabled - project['by_flag'].keys()))
+        values = {flag: int(flag in enabled) for flag in project['by_flag']}
+        patches = [dict(patch, value=values[patch['raw_name']]) for patch in project['patches']]
+
+        path = project['path']
+        patch_file = os.path.join(path, 'patches.h')
+        with open(patch_file, 'rb') as f:
+            data, changed = splice_patch_values(f.read(), patches)
+        files = {patch_file: data} if data is not None else {}
+        if project['config']:
+            lines = config_mk_lines(project['config'], sorted(enabled))
+            if lines != project['config']['raw']:
+                files[os.path.join(path, 'config.mk')] = ''.join(lines).encode()
+        if files:
+            steps.append({'project': project, 'values': values, 'changed': changed, 'files': files})
+    if unknown:
+        raise ValueError(f"Unknown flag(s): {', '.join(unknown)}")
+    return steps, skipped
+
+
+def apply_profile(projects, profile, parse_cache=None, backup=True):
+    """Apply a profile to every matching project in one transaction.
+
+    All patches.h and config.mk edits are staged first and then committed
+    together; if any write fails every file is rolled back and the projects
+    are left as they were. Unless backup is False the values each project
+    had before are backed up once the commit succeeded, so
+    `backups --restore` undoes the import.
+    Returns ({project name: changed flags}, skipped project names).
+    """
+    steps, skipped = stage_profile(projects, profile)
+    before = {step['project']['path']: {p['raw_name']: p['value'] for p in step['project']['patches']}
+              for step in steps}
+
+    files = {}
+    for step in steps:
+        files.update(step['files'])
+    commit_files(files)
+    # Only after the commit, so a rolled back import leaves no backups behind
+    if backup:
+        for path, values in before.items():
+            backup_store(path).create(values)
+
+    parse_cache = parse_cache or ParseCache()
+    results = {}
+    for step in steps:
+        project = step['project']
+        path = project['path']
+        for flag, value in step['values'].items():
+            project['by_flag'][flag]['value'] = value
+        patch_file = os.path.join(path, 'patches.h')
+        if patch_file in step['files']:
+            update_patch_offsets(step['files'][patch_file], project['patches'])
+        if os.path.join(path, 'config.mk') in step['files']:
+            project['config'].update(parse_config_mk(os.path.join(path, 'config.mk')))
+        parse_cache.store(path, parse_cache.keys(path), project['patches'], project['config'])
+        results[project['name']] = step['changed']
+    return results, skipped
+
+
+def restore_backup(project, name, parse_cache=None):
+    """Set a project's patch values from a backup and save them"""
+    values = backup_store(project['path']).load(name)
+    for patch in project['patches']:
+        patch['value'] = values.get(patch['raw_name'], 0)
+    return save_project(project, parse_cache, backup=False)
+
+
+class TerminalOutput:
+    """Build output window that a chatty `make -j` can't flood.
+
+    write() may be called from any thread for every line: lines are queued
+    and inserted in one batch per frame, the buffer keeps only the last
+    MAX_LINES lines and the complete log goes to a file under
+    $XDG_CACHE_HOME/suckless-patcher/logs, of which the newest MAX_LOGS
+    are kept.
+    """
+
+    MAX_LINES = 2000
+    MAX_LOGS = 20
+    FLUSH_MS = 33  # about one flush per frame at 30 fps
+
+    def __init__(self, parent):
+        import tempfile
+        from datetime import datetime
+        self.window = Gtk.Window(title="Build Output", transient_for=parent)
+        self.window.set_default_size(600, 400)
+
+        self.textview = Gtk.TextView(
+            monospace=True,
+            editable=False,
+            margin=10
+        )
+        self.buffer = self.textview.get_buffer()
+        self.end_mark = self.buffer.create_mark("end", self.buffer.get_end_iter(), False)
+
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        log_dir = os.path.join(base, 'suckless-patcher', 'logs')
+        os.makedirs(log_dir, exist_ok=True)
+        self.prune_logs(log_dir, self.MAX_LOGS - 1)
+        # Unique even for two builds started in the same second
+        fd, self.log_path = tempfile.mkstemp(
+            dir=log_dir, prefix=datetime.now().strftime('build-%Y%m%d-%H%M%S-'), suffix='.log')
+        self.log = os.fdopen(fd, 'w', encoding='utf-8', errors='replace')
+        self.log_label = Gtk.Label(xalign=0, margin=5, selectable=True)
+
+        # Only the newest MAX_LINES can end up on screen, so older queued
+        # lines are dropped here rather than inserted and trimmed again
+        self.pending = deque(maxlen=self.MAX_LINES)
+        self.lock = threading.Lock()
+        self.flush_source = None
+        self.lines = 0
+        self.truncated = False
+
+        scrolled = Gtk.ScrolledWindow()
+        scrolled.add(self.textview)
+
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        box.pack_start(scrolled, True, True, 0)
+        box.pack_start(self.log_label, False, False, 0)
+        self.window.add(box)
+        self.window.connect("destroy", self.on_destroy)
+        self.window.show_all()
+
+    @staticmethod
+    def prune_logs(log_dir, keep):
+        """Delete all but the newest keep build logs"""
+        logs = []
+        for entry in os.scandir(log_dir):
+            if entry.name.startswith('build-') and entry.name.endswith('.log'):
+                try:
+                    logs.append((entry.stat().st_mtime_ns, entry.path))
+                except FileNotFoundError:
+                    pass
+        logs.sort(reverse=True)
+        for _, path in logs[keep:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # another window pruned it first
+
+    def write(self, text):
+        """Queue a line of output; safe to call from worker threads"""
+        with self.lock:
+            if self.log is None:
+                return
+            self.log.write(text)
+            self.truncated |= len(self.pending) == self.MAX_LINES
+            self.pending.append(text)
+            if self.flush_source is None:
+                self.flush_source = GLib.timeout_add(self.FLUSH_MS, self.flush)
+
+    append_output = write
+
+    def flush(self):
+        with self.lock:
+            self.flush_source = None
+            batch = ''.join(self.pending)
+            self.pending.clear()
+            self.log.flush()
+        if not batch:
+            return False
+
+        self.buffer.insert(self.buffer.get_end_iter(), batch)
+        self.lines += batch.count('\n')
+        excess = self.lines - self.MAX_LINES
+        if excess > 0:
+            self.buffer.delete(self.buffer.get_start_iter(), self.buffer.get_iter_at_line(excess))
+            self.lines -= excess
+            self.truncated = True
+        if self.truncated:
+            self.log_label.set_text(f"Showing the last {self.MAX_LINES} lines; full log: {self.log_path}")
+        self.buffer.move_mark(self.end_mark, self.buffer.get_end_iter())
+        self.textview.scroll_to_mark(self.end_mark, 0, False, 0, 0)
+        return False
+
+    def destroy(self):
+        self.window.destroy()
+
+    def on_destroy(self, widget):
+        with self.lock:
+            if self.flush_source is not None:
+                GLib.source_remove(self.flush_source)
+                self.flush_source = None
+            self.log.close()
+            self.log = None
+
+class PasswordDialog:
+    def __init__(self, parent):
+        self.dialog = Gtk.Dialog(
+            title="Sudo Authentication",
+            transient_for=parent,
+            flags=0
+        )
+        self.dialog.add_buttons(
+            Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+            "OK", Gtk.ResponseType.OK
+        )
+        self.dialog.set_default_size(300, 100)
+
+        box = self.dialog.get_content_area()
+        self.password_entry = Gtk.Entry(
+            visibility=False,
+            activates_default=True
+        )
+        box.pack_start(Gtk.Label(label="Enter sudo password:"), False, False, 0)
+        box.pack_start(self.password_entry, False, False, 0)
+        self.dialog.show_all()
+
+    def run(self):
+        return self.dialog.run()
+
+    def destroy(self):
+        self.dialog.destroy()
+
+class SucklessPatcher:
+    def __init__(self, profile=False):
+        self.started = time.perf_counter()
+        self.profile = profile
+        self.projects = {}
+        self.current_filters = {}
+        self.backups = {}
+        self.tab_projects = {}
+        self.patch_views = {}
+        self.search_text = ''
+        self.search_hits = {}
+        self.config_mk_patterns = CONFIG_MK_PATTERNS
+        self.parse_cache = ParseCache()
+
+        self.setup_theme()
+        self.build_gui()
+        self.detect_projects()
+
+    def detect_projects(self):
+        search_paths = default_search_paths()
+        threading.Thread(target=self.load_projects, args=(search_paths,), daemon=True).start()
+
+    def load_projects(self, search_paths):
+        # Runs off the main loop; each project is handed to the GUI as soon as
+        # it is parsed so slow (e.g. NFS) trees don't hold up the others.
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        with ThreadPoolExecutor() as pool:
+            futures = [pool.submit(self.load_project, path)
+                       for path in iter_project_dirs(search_paths)]
+            for future in as_completed(futures):
+                try:
+                    project = future.result()
+                except Exception as e:
+                    print(f"Error loading project: {e}")
+                    continue
+                if project:
+                    GLib.idle_add(self.add_project, project)
+        print(self.parse_cache.report())
+        if self.profile:
+            GLib.idle_add(self.report_startup, "projects loaded")
+
+    def load_project(self, path):
+        return load_project(path, self.parse_cache)
+
+    def add_project(self, project):
+        name = project.pop('name')
+        if name in self.projects:
+            return False
+        self.projects[name] = project
+        self.load_backups(project)
+        self.add_project_tab(name, project)
+        self.populate_backups()
+        return False
+
+    def load_backups(self, *projects):
+        for project in projects or self.projects.values():
+            self.backups[project['path']] = backup_store(project['path']).manifests()
+
+    def setup_theme(self):
+        css = b"""
+        * {
+            background-color: #2d2d2d;
+            color: #ffffff;
+        }
+        .switch trough {
+            background-color: #ff453a;
+            border-radius: 15px;
+            border: 1px solid #3d3d3d;
+            min-width: 51px;
+            min-height: 31px;
+            transition: all 0.3s ease-in-out;
+        }
+        .switch:checked trough {
+            background-color: #34c759;
+            border-color: transparent;
+        }
+        .switch slider {
+            background-color: white;
+            border-radius: 13px;
+            min-width: 27px;
+            min-height: 27px;
+            margin: 1px;
+            box-shadow: 0 1px 3px rgba(0,0,0,0.2);
+            transition: margin 0.3s ease-in-out;
+        }
+        .switch:not(:checked) slider {
+            margin-left: 1px;
+            margin-right: 23px;
+        }
+        .switch:checked slider {
+            margin-left: 23px;
+            margin-right: 1px;
+        }
+        .backup-item {
+            padding: 8px;
+            border-bottom: 1px solid #444;
+        }
+        .backup-item:hover {
+            background-color: #3d3d3d;
+        }
+        """
+        provider = Gtk.CssProvider()
+        provider.load_from_data(css)
+        Gtk.StyleContext.add_provider_for_screen(
+            Gdk.Screen.get_default(),
+            provider,
+            Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
+        )
+
+    def build_gui(self):
+        self.window = Gtk.Window(title="Suckless Patcher")
+        self.window.set_default_size(1280, 768)
+
+        main_paned = Gtk.Paned.new(Gtk.Orientation.HORIZONTAL)
+        sidebar = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, width_request=250)
+
+        backup_header = Gtk.Label(label="Backup History", margin=10)
+        self.backup_list = Gtk.ListBox()
+        self.backup_list.connect("button-press-event", self.on_backup_button_press)
+        scrolled_backups = Gtk.ScrolledWindow()
+        scrolled_backups.add(self.backup_list)
+        sidebar.pack_start(backup_header, False, False, 0)
+        sidebar.pack_start(scrolled_backups, True, True, 0)
+
+        main_content = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        self.search_entry = Gtk.SearchEntry(placeholder_text="Search patches (regex allowed)...")
+        self.search_entry.connect("search-changed", self.on_search_changed)
+        self.search_entry.connect("activate", self.on_search_changed)
+        main_content.pack_start(self.search_entry, False, False, 5)
+
+        self.notebook = Gtk.Notebook()
+        self.notebook.connect("switch-page", self.on_page_switched)
+        self.create_project_tabs()
+        main_content.pack_start(self.notebook, True, True, 0)
+
+        btn_box = Gtk.Box(spacing=10, margin=10)
+        for btn in [("Save", self.on_save), ("Import", self.on_import), ("Export", self.on_export),
+                    ("Build", self.on_build),
+                    ("Build All", self.on_build_all)]:
+            button = Gtk.Button(label=btn[0])
+            button.connect("clicked", btn[1])
+            btn_box.pack_end(button, False, False, 0)
+        main_content.pack_start(btn_box, False, False, 0)
+
+        main_paned.add1(sidebar)
+        main_paned.add2(main_content)
+        self.window.add(main_paned)
+        self.window.connect("destroy", Gtk.main_quit)
+        if self.profile:
+            self.first_draw_handler = self.window.connect("draw", self.on_first_draw)
+        self.populate_backups()
+
+    def on_first_draw(self, widget, cr):
+        widget.disconnect(self.first_draw_handler)
+        self.report_startup("first paint")
+        return False
+
+    def report_startup(self, stage):
+        elapsed = (time.perf_counter() - self.started) * 1000
+        print(f"{stage}: {elapsed:.0f} ms, RSS {rss_mib():.1f} MiB")
+        return False
+
+    def on_backup_button_press(self, listbox, event):
+        if event.button == 3:  # Right click
+            row = listbox.get_row_at_y(int(event.y))
+            if row:
+                menu = Gtk.Menu()
+                delete_item = Gtk.MenuItem(label="Delete Backup")
+                delete_item.connect("activate", self.on_delete_backup, row)
+                menu.append(delete_item)
+                menu.show_all()
+                menu.popup(None, None, None, None, event.button, event.time)
+                return True
+        return False
+
+    def on_delete_backup(self, menu_item, row):
+        box = row.get_child()
+        label = box.get_children()[0]
+        backup_name = label.get_text()
+
+        for project_path in self.backups:
+            backup_path = os.path.join(project_path, '.backups', backup_name)
+            if os.path.exists(backup_path):
+                try:
+                    backup_store(project_path).delete(backup_name)
+                    self.load_backups()
+                    self.populate_backups()
+                    self.show_message(f"Deleted backup: {backup_name}")
+                except Exception as e:
+                    self.show_message(f"Error deleting backup: {str(e)}", is_error=True)
+                break
+
+    def populate_backups(self):
+        for child in self.backup_list.get_children():
+            self.backup_list.remove(child)
+
+        for project_path, backups in self.backups.items():
+            for backup in backups:
+                row = Gtk.ListBoxRow()
+                box = Gtk.Box(spacing=10)
+                label = Gtk.Label(label=os.path.basename(backup))
+                restore_btn = Gtk.Button(label="Restore")
+                restore_btn.connect("clicked", self.on_restore_backup, project_path, backup)
+                box.pack_start(label, True, True, 0)
+                box.pack_start(restore_btn, False, False, 0)
+                row.add(box)
+                self.backup_list.add(row)
+        self.backup_list.show_all()
+
+    def create_project_tabs(self):
+        for project_name, data in self.projects.items():
+            self.add_project_tab(project_name, data)
+
+    def add_project_tab(self, project_name, data):
+        # Left empty until the page is first shown, see on_page_switched
+        tab = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        tab.show()
+        self.tab_projects[tab] = project_name
+        self.notebook.append_page(tab, Gtk.Label(label=project_name))
+
+    def on_page_switched(self, notebook, tab, page_num):
+        project_name = self.tab_projects.get(tab)
+        if project_name is None:
+            return
+        if self.projects[project_name]['type'] == 'dwmblocks':
+            if not tab.get_children():
+                self.populate_blocks_tab(tab, project_name)
+            return
+        if project_name not in self.patch_views:
+            self.populate_tab(tab, project_name)
+        elif self.search_hits[project_name][0] != self.search_text:
+            self.search_project(project_name)
+            self.patch_views[project_name].refilter()
+
+    def populate_tab(self, tab, project_name):
+        # A TreeView only renders the rows that are on screen, so a 192 flag
+        # project costs one model row per patch instead of a widget tree each
+        data = self.projects[project_name]
+        code = project_index(data, 'code')
+        store = Gtk.ListStore(bool, str, int, str)
+        for index, patch in enumerate(data['patches']):
+            store.append([bool(patch['value']), patch['name'], index,
+                          code.estimate(patch['raw_name'])])
+        model = store.filter_new()
+        self.search_project(project_name)
+        model.set_visible_func(self.patch_visible, project_name)
+
+        view = Gtk.TreeView(model=model, headers_visible=False, enable_search=False)
+        status = Gtk.Label(xalign=0, wrap=True, margin=5)
+        toggle = Gtk.CellRendererToggle()
+        toggle.connect("toggled", self.on_patch_toggled, model, data, status)
+        for column in (Gtk.TreeViewColumn("Enabled", toggle, active=0),
+                       Gtk.TreeViewColumn("Patch", Gtk.CellRendererText(), text=1),
+                       Gtk.TreeViewColumn("Code", Gtk.CellRendererText(foreground='#888888'), text=3)):
+            column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+            view.append_column(column)
+        view.get_column(0).set_fixed_width(60)
+        view.get_column(1).set_expand(True)
+        view.get_column(2).set_fixed_width(170)
+        view.set_fixed_height_mode(True)
+
+        details = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=5, margin=10)
+        view.get_selection().connect("changed", self.on_patch_selected, data, details)
+
+        scrolled = Gtk.ScrolledWindow()
+        scrolled.add(view)
+        scrolled_details = Gtk.ScrolledWindow(height_request=150)
+        scrolled_details.add(details)
+        paned = Gtk.Paned.new(Gtk.Orientation.VERTICAL)
+        paned.pack1(scrolled, True, False)
+        paned.pack2(scrolled_details, False, True)
+        tab.pack_start(paned, True, True, 0)
+        tab.pack_start(status, False, False, 0)
+        tab.show_all()
+        self.patch_views[project_name] = model
+
+    def populate_blocks_tab(self, tab, project_name):
+        data = self.projects[project_name]
+        store = Gtk.ListStore(str, int, int, str, str, str)
+        for block in data['blocks']:
+            store.append([block['icon'] + block['command'], block['interval'], block['signal'], '', '', ''])
+        view = Gtk.TreeView(model=store)
+        for index, title in enumerate(("Command", "Every (s)", "Signal", "Wall ms", "CPU ms", "CPU-s/h")):
+            column = Gtk.TreeViewColumn(title, Gtk.CellRendererText(), text=index)
+            column.set_expand(index == 0)
+            view.append_column(column)
+
+        report = Gtk.Label(xalign=0, wrap=True, selectable=True, margin=10)
+        report.set_text("Profile runs each block command a few times in a scratch directory "
+                        "and estimates what the schedule costs per hour.")
+        button = Gtk.Button(label="Profile Blocks", margin=6)
+        button.connect("clicked", self.on_profile_blocks, data, store, report)
+
+        scrolled = Gtk.ScrolledWindow()
+        scrolled.add(view)
+        tab.pack_start(scrolled, True, True, 0)
+        tab.pack_start(report, False, False, 0)
+        tab.pack_start(button, False, False, 0)
+        tab.show_all()
+
+    def on_profile_blocks(self, button, data, store, report):
+        button.set_sensitive(False)
+        report.set_text("Sampling blocks...")
+
+        def show(index, sample):
+            block = data['blocks'][index]
+            per_hour = 3600 / block['interval'] * sample['cpu'] if block['interval'] else 0
+            row = store[index]
+            row[3] = f"{sample['wall'] * 1000:.1f}" + (' (timeout)' if sample['timeouts'] else '')
+            row[4] = f"{sample['cpu'] * 1000:.1f}"
+            row[5] = f"{per_hour:.2f}" if block['interval'] else 'on signal'
+            return False
+
+        def done(samples):
+            data['samples'] = samples
+            report.set_text("\n".join(block_report(data['blocks'], samples)))
+            button.set_sensitive(True)
+            return False
+
+        def run():
+            samples = []
+            for index, block in enumerate(data['blocks']):
+                samples.append(sample_block(block['command']))
+                GLib.idle_add(show, index, samples[-1])
+            GLib.idle_add(done, samples)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def on_patch_selected(self, selection, data, details):
+        # Only the selected patch gets description and link widgets
+        for child in details.get_children():
+            child.destroy()
+        model, tree_iter = selection.get_selected()
+        if tree_iter is None:
+            return
+        patch = data['patches'][model[tree_iter][2]]
+
+        desc_label = Gtk.Label(
+            label="\n".join(patch.get('description', ['No description available'])),
+            wrap=True,
+            xalign=0
+        )
+        url_box = Gtk.Box(spacing=5)
+        for url in patch.get('urls', []):
+            btn = Gtk.LinkButton(uri=url, label=url)
+            url_box.pack_start(btn, False, False, 0)
+
+        details.pack_start(Gtk.Label(label=patch['name'], xalign=0), False, False, 0)
+        details.pack_start(desc_label, False, False, 0)
+        for line in project_index(data, 'graph').describe(patch['raw_name']):
+            details.pack_start(Gtk.Label(label=line, xalign=0, wrap=True), False, False, 0)
+        code_index = project_index(data, 'code')
+        code = code_index.data.get(patch['raw_name'])
+        if code:
+            files = ", ".join(
+                f"{name} ({', '.join(f'{a}-{b}' if a != b else str(a) for a, b in ranges[:3])}"
+                f"{', ...' if len(ranges) > 3 else ''})"
+                for name, ranges in list(code['files'].items())[:6])
+            more = len(code['files']) - 6
+            details.pack_start(Gtk.Label(
+                label=f"Code: {code_index.estimate(patch['raw_name'])} in {files}"
+                      f"{f' and {more} more file(s)' if more > 0 else ''}",
+                xalign=0, wrap=True), False, False, 0)
+        details.pack_start(url_box, False, False, 0)
+        details.show_all()
+
+    def on_patch_toggled(self, renderer, path, model, data, status):
+        store = model.get_model()
+        store_iter = model.convert_iter_to_child_iter(model.get_iter(path))
+        active = not store[store_iter][0]
+        store[store_iter][0] = active
+        patch = data['patches'][store[store_iter][2]]
+        patch['value'] = int(active)
+
+        by_flag = data['by_flag']
+        issues = project_index(data, 'graph').check(
+            patch['raw_name'], lambda flag: by_flag[flag]['value'] if flag in by_flag else 0)
+        colors = {'error': '#e06c75', 'warning': '#e5c07b', 'info': '#abb2bf'}
+        status.set_markup("\n".join(
+            f"<span foreground='{colors[level]}'>{GLib.markup_escape_text(message)}</span>"
+            for level, message in issues))
+
+    def patch_visible(self, model, tree_iter, project_name):
+        hits = self.search_hits[project_name][1]
+        return hits is None or model[tree_iter][2] in hits
+
+    def search_project(self, project_name):
+        # Keyed by the query text so switching tabs only re-queries projects
+        # that were not current when the query last changed
+        # An empty query shows everything; don't build the index for that
+        hits = None
+        if self.search_text.strip():
+            hits = project_index(self.projects[project_name], 'index').query(self.search_text)
+        self.search_hits[project_name] = (self.search_text, hits)
+
+    def on_search_changed(self, entry):
+        # GtkSearchEntry already debounces "search-changed"; "activate"
+        # (Enter) comes through immediately
+        self.search_text = entry.get_text()
+        tab = self.notebook.get_nth_page(self.notebook.get_current_page())
+        project_name = self.tab_projects.get(tab)
+        model = self.patch_views.get(project_name)
+        if model is not None:
+            self.search_project(project_name)
+            model.refilter()
+
+    def on_save(self, button):
+        current_project = list(self.projects.keys())[self.notebook.get_current_page()]
+        project = self.projects[current_project]
+        project_path = project['path']
+        if project['type'] != 'flexipatch':
+            self.show_message(f"{current_project} has no patch flags to save")
+            return
+
+        try:
+            changed = save_project(project, self.parse_cache)
+        except OSError as e:
+            self.show_message(f"Save failed: {str(e)}", is_error=True)
+            return
+
+        self.show_message(f"Configuration saved and backed up! ({len(changed)} flag(s) changed)")
+
+    def on_export(self, button):
+        enabled_patches = {}
+        for project, data in self.projects.items():
+            enabled = [p['raw_name'] for p in data['patches'] if p['value']]
+            if enabled:
+                enabled_patches[project] = enabled
+
+        dialog = Gtk.FileChooserDialog(
+            title="Export Patches",
+            parent=self.window,
+            action=Gtk.FileChooserAction.SAVE,
+            buttons=(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+                     Gtk.STOCK_SAVE, Gtk.ResponseType.OK)
+        )
+        dialog.set_current_name("suckless_patches.json")
+
+        if dialog.run() == Gtk.ResponseType.OK:
+            with open(dialog.get_filename(), 'w') as f:
+                json.dump(enabled_patches, f, indent=2)
+            self.show_message("Patches exported successfully!")
+        dialog.destroy()
+
+    def on_import(self, button):
+        dialog = Gtk.FileChooserDialog(
+            title="Import Patches",
+            parent=self.window,
+            action=Gtk.FileChooserAction.OPEN,
+            buttons=(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+                     Gtk.STOCK_OPEN, Gtk.ResponseType.OK)
+        )
+        filename = dialog.get_filename() if dialog.run() == Gtk.ResponseType.OK else None
+        dialog.destroy()
+        if not filename:
+            return
+
+        try:
+            with open(filename, 'r') as f:
+                profile = json.load(f)
+            results, skipped = apply_profile(self.projects, profile, self.parse_cache)
+        except (OSError, ValueError) as e:
+            self.show_message(f"Import failed, nothing was changed: {str(e)}", is_error=True)
+            return
+
+        for project_name in results:
+            self.refresh_project(project_name)
+        self.load_backups(*(self.projects[name] for name in results))
+        self.populate_backups()
+        message = f"Imported into {len(results)} project(s), " \
+                  f"{sum(len(changed) for changed in results.values())} flag(s) changed"
+        if skipped:
+            message += f"; not found: {', '.join(skipped)}"
+        self.show_message(message)
+
+    def on_build(self, button):
+        current_project = list(self.projects.keys())[self.notebook.get_current_page()]
+        self.build_projects([(current_project, self.projects[current_project]['path'])])
+
+    def on_build_all(self, button):
+        self.build_projects([(name, project['path']) for name, project in self.projects.items()])
+
+    def build_projects(self, projects):
+        dialog = PasswordDialog(self.window)
+        response = dialog.run()
+        password = dialog.password_entry.get_text()
+        dialog.destroy()
+
+        if response != Gtk.ResponseType.OK or not password:
+            return
+
+        term = TerminalOutput(self.window)
+        queue = BuildQueue(projects, password,
+                           on_output=term.write)
+        password = None
+
+        def run_build():
+            try:
+                status = queue.run()
+                failed = [name for name, result in status.items()
+                          if result not in ('installed', 'up to date')]
+                if not failed:
+                    GLib.idle_add(term.destroy)  # Close terminal on success
+                    if all(result == 'up to date' for result in status.values()):
+                        GLib.idle_add(self.show_message,
+                                      f"{', '.join(status)}: up to date")
+                elif queue.errors:
+                    lines = [f"{name}: {format_diagnostic(error)}"
+                             for name, errors in queue.errors.items() for error in errors[:5]]
+                    GLib.idle_add(self.show_message,
+                        "Syntax check failed, nothing was installed:\n" + "\n".join(lines),
+                        is_error=True)
+                else:
+                    GLib.idle_add(self.show_message,
+                        f"Build failed for {', '.join(failed)}! Possible reasons:\n"
+                        "1. Incorrect sudo password\n"
+                        "2. config.mk requirements not met\n"
+                        "3. Missing dependencies",
+                        is_error=True)
+            except Exception as e:
+                GLib.idle_add(self.show_message, f"Error: {str(e)}", is_error=True)
+
+        threading.Thread(target=run_build, daemon=True).start()
+
+    def on_restore_backup(self, button, project_path, backup_file):
+        try:
+            for project_name, project in self.projects.items():
+                if project['path'] == project_path:
+                    break
+            else:
+                raise ValueError(f"Unknown project {project_path}")
+
+            restore_backup(project, backup_file, self.parse_cache)
+            self.refresh_project(project_name)
+        except Exception as e:
+            self.show_message(f"Restore failed: {str(e)}", is_error=True)
+            return
+
+        # A profile that was built before can be installed without compiling
+        plan, fingerprint = BuildFingerprint(project_path).plan()
+        if plan != 'up to date' and ArtifactCache().lookup(ArtifactCache.key(project_name, fingerprint)):
+            self.show_message(f"Restored backup: {backup_file}\n"
+                              "This profile was built before; installing the cached build.")
+            self.build_projects([(project_name, project_path)])
+        else:
+            self.show_message(f"Restored backup: {backup_file}")
+
+    def refresh_project(self, project_name):
+        """Sync a populated tab's toggles with the in-memory patch values"""
+        model = self.patch_views.get(project_name)
+        if model is None:
+            return
+        patches = self.projects[project_name]['patches']
+        for row in model.get_model():
+            row[0] = bool(patches[row[2]]['value'])
+
+    def show_message(self, message, is_error=False):
+        dialog = Gtk.MessageDialog(
+            parent=self.window,
+            flags=0,
+            message_type=Gtk.MessageType.ERROR if is_error else Gtk.MessageType.INFO,
+            buttons=Gtk.ButtonsType.OK,
+            text=message
+        )
+        dialog.run()
+        dialog.destroy()
+
+    def run(self):
+        self.window.show_all()
+        Gtk.main()
+
+CLI_COMMANDS = ('list', 'set', 'apply', 'fleet', 'build', 'backups')
+
+
+def flag_name(name):
+    """FLAG, flag and FLAG_PATCH all name the same patch"""
+    return re.sub(r'_PATCH$', '', name.upper())
+
+
+def is_project_dir(path):
+    return any(os.path.exists(os.path.join(path, name)) for name in ('patches.def.h', 'dwmblocks.c'))
+
+
+def find_projects(paths=None, parse_cache=None):
+    """{name: project} for the projects in paths without the GUI indexes.
+
+    Each path is a project directory or a directory holding projects; the
+    default search paths are used when paths is empty.
+    """
+    parse_cache = parse_cache or ParseCache()
+    projects = {}
+    for root in paths or default_search_paths():
+        root = os.path.abspath(root)
+        for path in [root] if is_project_dir(root) else iter_project_dirs([root]):
+            project = load_project(path, parse_cache)
+            if project:
+                projects.setdefault(project['name'], project)
+    return projects
+
+
+def select_projects(projects, names, kind=None):
+    """The named projects (all of them when names is empty), optionally of one type"""
+    missing = [name for name in names if name not in projects]
+    if missing:
+        raise ValueError(f"Unknown project(s): {', '.join(missing)}")
+    return [projects[name] for name in names or sorted(projects)
+            if kind is None or projects[name]['type'] == kind]
+
+
+def set_patch_values(project, values, parse_cache=None):
+    """Set {flag: value} on a project and save it; returns the changed flags"""
+    if all(project['by_flag'][flag]['value'] == value for flag, value in values.items()):
+        return []
+    for flag, value in values.items():
+        project['by_flag'][flag]['value'] = value
+    return save_project(project, parse_cache)
+
+
+FLEET_COLUMNS = ('root', 'status', 'projects', 'changed', 'load_seconds', 'apply_seconds',
+                 'build_seconds', 'built', 'error')
+
+
+def fleet_tree(root, profile):
+    """Process pool worker: apply a profile to the projects below one tree root.
+
+    Uses the same find_projects/apply_profile core as the GUI and the
+    command line, so each tree is validated and committed as a unit.
+    Returns a row for fleet_apply; errors are reported in the row.
+    """
+    row = {'root': root, 'status': 'ok', 'projects': '', 'changed': 0, 'load_seconds': 0.0,
+           'apply_seconds': 0.0, 'build_seconds': 0.0, 'built': '', 'error': '', 'builds': []}
+    started = time.perf_counter()
+    path = os.path.expanduser(root)
+    if not os.path.isdir(path):
+        # A mistyped root must not pass for a tree without projects
+        row['status'] = 'failed'
+        row['error'] = f"No such directory: {root}"
+        return row
+    try:
+        projects = {name: project for name, project in find_projects([path]).items()
+                    if name in profile and project['type'] == 'flexipatch'}
+        row['load_seconds'] = round(time.perf_counter() - started, 3)
+        row['projects'] = ','.join(sorted(projects))
+        row['builds'] = [(name, project['path']) for name, project in sorted(projects.items())]
+        started = time.perf_counter()
+        results, _ = apply_profile(projects, {name: profile[name] for name in projects})
+        row['apply_seconds'] = round(time.perf_counter() - started, 3)
+        row['changed'] = sum(len(changed) for changed in results.values())
+        if not projects:
+            row['status'] = 'no projects'
+    except (OSError, ValueError, KeyError) as e:
+        row['status'] = 'failed'
+        row['error'] = str(e).replace('\t', ' ').replace('\n', ' ')
+    return row
+
+
+def fleet_build(row, jobs):
+    """Compile the projects of one applied tree; updates and returns its row"""
+    last = deque(maxlen=1)
+    started = time.perf_counter()
+    queue = BuildQueue(row['builds'], on_output=last.append, jobs=jobs)
+    status = queue.run()
+    row['build_seconds'] = round(time.perf_counter() - started, 2)
+    row['built'] = ','.join(f"{name}:{result}" for name, result in status.items())
+    if 'failed' in status.values():
+        row['status'] = 'build failed'
+        # The first syntax error says more than the last line of make output
+        errors = [error for errors in queue.errors.values() for error in errors]
+        error = format_diagnostic(errors[0]) if errors else (last[0] if last else '')
+        row['error'] = error.strip().replace('\t', ' ').replace('\n', ' ')
+    return row
+
+
+def fleet_apply(profile, roots, jobs=None, build=False, build_concurrency=2, output=None):
+    """Apply a profile to many source trees, optionally build them, and tabulate.
+
+    Trees are loaded and updated in a process pool, one tree per task and
+    one worker per CPU, so hundreds of roots are spread over every core.
+    With build, each tree is compiled as soon as its profile is applied,
+    at most build_concurrency trees at a time with the CPUs split between
+    them. The per-tree report is written as TSV in root order.
+    """
+    from datetime import datetime
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+    roots = [os.path.abspath(root) for root in roots]
+    build_concurrency = max(1, build_concurrency)
+    rows = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs or build_jobs()) as pool, \
+            ThreadPoolExecutor(max_workers=build_concurrency) as builders:
+        # Every task is submitted, and so every worker forked, before any
+        # build thread starts
+        futures = [pool.submit(fleet_tree, root, profile) for root in roots]
+        builds = []
+        for future in as_completed(futures):
+            row = future.result()
+            print(f"{row['root']}: {row['status']}, {row['changed']} flag(s) changed "
+                  f"in {row['load_seconds'] + row['apply_seconds']:.2f}s"
+                  + (f" ({row['error']})" if row['error'] else ''))
+            if build and row['status'] == 'ok':
+                builds.append(builders.submit(fleet_build, row, max(1, build_jobs() // build_concurrency)))
+            else:
+                rows.append(row)
+        for future in as_completed(builds):
+            row = future.result()
+            print(f"{row['root']}: {row['built'] or 'nothing to build'} in {row['build_seconds']}s")
+            rows.append(row)
+
+    rows.sort(key=lambda row: roots.index(row['root']))
+    output = output or f"fleet-{datetime.now().strftime('%Y%m%d_%H%M%S')}.tsv"
+    with open(output, 'w') as f:
+        f.write('\t'.join(FLEET_COLUMNS) + '\n')
+        for row in rows:
+            f.write('\t'.join(str(row.get(column, '')) for column in FLEET_COLUMNS) + '\n')
+    failed = sum(row['status'] not in ('ok', 'no projects') for row in rows)
+    print(f"{len(rows)} tree(s), {failed} failed, in {time.perf_counter() - started:.1f}s; "
+          f"results in {output}")
+    return rows
+
+
+def cli_list(args, projects, parse_cache):
+    for project in select_projects(projects, args.projects):
+        if project['type'] == 'dwmblocks':
+            for block in project['blocks']:
+                print(f"{project['name']}\t{block['command']}\t{block['interval']}")
+            continue
+        for patch in project['patches']:
+            if patch['value'] or not args.enabled:
+                print(f"{project['name']}\t{patch['raw_name']}\t{patch['value']}")
+    return 0
+
+
+def cli_set(args, projects, parse_cache):
+    targets = select_projects(projects, [args.project] if args.project else [], 'flexipatch')
+    values = {}
+    for item in args.assignments:
+        flag, sep, value = item.partition('=')
+        # Only what PATCH_VALUE_RE can read back out of patches.h
+        if not sep or not re.fullmatch(r'\d+', value.strip()):
+            raise ValueError(f"Expected FLAG=VALUE with a non-negative integer VALUE, got {item!r}")
+        values[flag_name(flag.strip())] = int(value)
+    unknown = [flag for flag in values if not any(flag in p['by_flag'] for p in targets)]
+    if unknown:
+        raise ValueError(f"Unknown flag(s): {', '.join(unknown)}")
+
+    for project in targets:
+        own = {flag: value for flag, value in values.items() if flag in project['by_flag']}
+        if own:
+            changed = set_patch_values(project, own, parse_cache)
+            print(f"{project['name']}: {', '.join(changed) or 'no changes'}")
+    return 0
+
+
+def cli_apply(args, projects, parse_cache):
+    """profile.json maps a project name to its enabled flags; all others are disabled"""
+    with open(args.profile, 'r') as f:
+        profile = json.load(f)
+    results, skipped = apply_profile(projects, profile, parse_cache)
+    for name in skipped:
+        print(f"{name}: not found, skipped")
+    for name in sorted(profile):
+        if name in results:
+            print(f"{name}: {', '.join(results[name]) or 'no changes'}")
+        elif name not in skipped:
+            print(f"{name}: no changes")
+    return 0
+
+
+def cli_build(args, projects, parse_cache):
+    password = None
+    if args.install:
+        import getpass
+        password = getpass.getpass("sudo password: ")
+    queue = BuildQueue([(p['name'], p['path']) for p in select_projects(projects, args.projects)],
+                       password=password, jobs=args.jobs)
+    status = queue.run()
+    for name, result in status.items():
+        print(f"{name}: {result}")
+    return int('failed' in status.values())
+
+
+def cli_backups(args, projects, parse_cache):
+    targets = select_projects(projects, args.projects, 'flexipatch')
+    if args.restore:
+        if len(targets) != 1:
+            raise ValueError("--restore needs exactly one project")
+        changed = restore_backup(targets[0], args.restore, parse_cache)
+        print(f"{targets[0]['name']}: restored {args.restore}: {', '.join(changed) or 'no changes'}")
+        return 0
+    for project in targets:
+        for entry in backup_store(project['path']).query(limit=args.limit):
+            print(f"{project['name']}\t{entry['name']}\t{entry['created']}")
+    return 0
+
+
+def cli_fleet(args, projects, parse_cache):
+    with open(args.profile, 'r') as f:
+        profile = json.load(f)
+    rows = fleet_apply(profile, args.roots, jobs=args.jobs, build=args.build,
+                       build_concurrency=args.build_concurrency, output=args.output)
+    return int(any(row['status'] not in ('ok', 'no projects') for row in rows))
+
+
+def cli(argv):
+    """Headless commands; nothing here imports GTK"""
+    import argparse
+    parser = argparse.ArgumentParser(prog='suckless-patcher')
+    parser.add_argument('-C', '--path', action='append', default=[],
+                        help="project directory or directory of projects (repeatable)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('list', help="print project, flag and value as TSV")
+    command.add_argument('projects', nargs='*')
+    command.add_argument('--enabled', action='store_true', help="only enabled flags")
+    command.set_defaults(run=cli_list)
+
+    command = commands.add_parser('set', help="set patch flags and save")
+    command.add_argument('assignments', nargs='+', metavar='FLAG=VALUE')
+    command.add_argument('-p', '--project', help="only this project")
+    command.set_defaults(run=cli_set)
+
+    command = commands.add_parser('apply', help="enable exactly the flags listed in a profile")
+    command.add_argument('profile', help='JSON file as written by Export: {"dwm": ["VANITYGAPS", ...], ...}')
+    command.set_defaults(run=cli_apply)
+
+    command = commands.add_parser('build', help="compile, and with --install install, projects")
+    command.add_argument('projects', nargs='*')
+    command.add_argument('--install', action='store_true', help="sudo make install afterwards")
+    command.add_argument('-j', '--jobs', type=int)
+    command.set_defaults(run=cli_build)
+
+    command = commands.add_parser('fleet', help="apply a profile to many source trees")
+    command.add_argument('profile')
+    command.add_argument('roots', nargs='+', metavar='ROOT',
+                         help="project directory or directory of projects, e.g. ~user/.local/src")
+    command.add_argument('--build', action='store_true', help="compile each tree after applying")
+    command.add_argument('-j', '--jobs', type=int, help="trees loaded and applied at once")
+    command.add_argument('--build-concurrency', type=int, default=2, metavar='N',
+                         help="trees compiled at once (default 2)")
+    command.add_argument('-o', '--output', help="TSV report (default fleet-DATE.tsv)")
+    command.set_defaults(run=cli_fleet)
+
+    command = commands.add_parser('backups', help="list or restore patch backups")
+    command.add_argument('projects', nargs='*')
+    command.add_argument('--restore', metavar='NAME')
+    command.add_argument('-n', '--limit', type=int)
+    command.set_defaults(run=cli_backups)
+
+    args = parser.parse_args(argv)
+    parse_cache = ParseCache()
+    try:
+        # fleet finds its own projects below each root
+        projects = find_projects(args.path, parse_cache) if args.command != 'fleet' else {}
+        return args.run(args, projects, parse_cache)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"suckless-patcher: {e}", file=sys.stderr)
+        return 1
+
+
+def main(argv):
+    """Entry point for suckless-patcher.py; argv without the program name"""
+    if argv[:1] and argv[0] in CLI_COMMANDS + ('-C', '--path', '-h', '--help'):
+        return cli(argv)
+    if argv[:1] == ['--bench-parse']:
+        bench_parse(int(argv[1]) if len(argv) > 1 else 10000)
+        return 0
+    if argv[:1] == ['--bench-search']:
+        bench_search(int(argv[1]) if len(argv) > 1 else 20000)
+        return 0
+    if argv[:1] == ['--bench-matrix'] and len(argv) > 1:
+        # --bench-matrix PROJECT [FLAG...]: FLAG without the _PATCH suffix
+        bench_matrix(argv[1], [flag_name(flag) for flag in argv[2:]])
+        return 0
+    if argv[:1] == ['--bench-diff'] and len(argv) == 3:
+        bench_diff(argv[1], argv[2])
+        return 0
+    if argv[:1] == ['--profile-blocks']:
+        profile_blocks(argv[1] if len(argv) > 1 else os.path.expanduser('~/.local/src/dwmblocks'),
+                       int(argv[2]) if len(argv) > 2 else 3)
+        return 0
+    if argv[:1] == ['--gc-backups']:
+        for path in argv[1:] or iter_project_dirs(default_search_paths()):
+            store = BackupStore(os.path.join(path, '.backups'))
+            if os.path.isdir(store.objects_dir):
+                removed, freed = store.gc()
+                print(f"{path}: removed {removed} unreferenced blob(s), {freed} bytes")
+        return 0
+    if argv[:1] == ['--invalidate-cache']:
+        cache = ParseCache()
+        removed = sum(cache.invalidate(os.path.abspath(p)) for p in argv[1:]) \
+            if len(argv) > 1 else cache.invalidate()
+        print(f"Removed {removed} cached project(s) from {cache.cache_dir}")
+        return 0
+    profile = '--profile-startup' in argv
+    if profile:
+        print(f"before GTK import: RSS {rss_mib():.1f} MiB")
+        started = time.perf_counter()
+    require_gtk()
+    if profile:
+        print(f"GTK import: {(time.perf_counter() - started) * 1000:.0f} ms, RSS {rss_mib():.1f} MiB")
+    app = SucklessPatcher(profile=profile)
+    app.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))